@@ -0,0 +1,119 @@
+"""Period filter of get_df_sales: per-row strptime vs timestamp mask vs index.
+
+python benchmarks/period_filter.py [--rows 1000000]
+"""
+
+import argparse
+import datetime
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "wbtracker"))
+
+import database  # noqa: E402
+import dates  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import storage  # noqa: E402
+
+
+def build(rows: int, root: pathlib.Path) -> database.Database:
+    (root / "products.json").write_text('{"products": []}')
+    (root / "sales.json").write_text('{"sales": []}')
+    db = database.Database(storage.JsonStorage(root))
+    rng = np.random.default_rng(0)
+    ids = [str(100000 + i) for i in range(1000)]
+    db.add_products_bulk(
+        {
+            "store": ["wb", "ozon"] * 500,
+            "id": ids,
+            "vendor_code": [f"v{i}" for i in range(1000)],
+            "name": [f"n{i}" for i in range(1000)],
+            "price": [1000] * 1000,
+            "cost": [400] * 1000,
+            "brand": ["b"] * 1000,
+        }
+    )
+    start = dates.to_timestamp(datetime.datetime(2022, 1, 1))
+    timestamps = start + rng.integers(0, 4 * 365 * 24 * 3600, rows)
+    product = rng.integers(0, 1000, rows)
+    store = np.array(["wb", "ozon"])[product % 2]
+    moments = timestamps.astype("datetime64[s]").astype(datetime.datetime)
+    db.add_sales_bulk(
+        {
+            "store": store,
+            "sticker": np.arange(rows).astype(str),
+            "id": np.array(ids)[product],
+            "date": [
+                moment.strftime(dates.WB_FORMAT if wb else dates.OZON_FORMAT)
+                for moment, wb in zip(moments, store == "wb")
+            ],
+            "timestamp": timestamps,
+            "price": rng.integers(500, 1500, rows),
+        }
+    )
+    return db
+
+
+def legacy(full: pd.DataFrame, start, end) -> pd.DataFrame:
+    def check_date(row: pd.Series):
+        try:
+            date_format = dates.WB_FORMAT if row["store"] == "wb" else dates.OZON_FORMAT
+            return start <= datetime.datetime.strptime(row["date"], date_format) <= end
+        except Exception:
+            return False
+
+    return full[full.apply(check_date, axis=1)]
+
+
+def mask(full: pd.DataFrame, start, end) -> pd.DataFrame:
+    timestamps = full["timestamp"]
+    return full[
+        (timestamps >= dates.to_timestamp(start))
+        & (timestamps <= dates.to_timestamp(end))
+    ]
+
+
+def index(db: database.Database, start, end) -> pd.DataFrame:
+    rows = db._sales.rows(dates.to_timestamp(start), dates.to_timestamp(end))
+    return database._join(db, rows)
+
+
+def measure(name: str, run, repeat: int = 3) -> float:
+    best = min(_time(run) for _ in range(repeat))
+    print(f"{name:>28}: {best * 1000:10.1f} ms")
+    return best
+
+
+def _time(run) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    start, end = datetime.datetime(2024, 3, 1), datetime.datetime(
+        2024, 3, 31, 23, 59, 59
+    )
+    with tempfile.TemporaryDirectory() as root:
+        db = build(args.rows, pathlib.Path(root))
+        full = database._join(db)
+        expected = len(mask(full, start, end))
+        assert len(index(db, start, end)) == expected
+        print(f"{args.rows} sales, {expected} in {start:%m.%Y}")
+        slow = measure("apply + strptime per row", lambda: legacy(full, start, end), 1)
+        fast = measure("timestamp mask on get_full", lambda: mask(full, start, end))
+        measure("full join + mask", lambda: mask(database._join(db), start, end))
+        db._sales._partition = None
+        measure("first index build", lambda: db._sales._partitions(), 1)
+        indexed = measure("searchsorted + join period", lambda: index(db, start, end))
+        print(f"speedup: mask x{slow / fast:.0f}, index x{slow / indexed:.0f}")
+
+
+if __name__ == "__main__":
+    main()
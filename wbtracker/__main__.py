@@ -0,0 +1,127 @@
+import argparse
+import datetime
+import pathlib
+import sys
+from collections.abc import Iterable
+
+# modules import each other by their plain names, as when main.py is run
+sys.path.insert(0, str(pathlib.Path(__file__).parent))
+
+import analysis  # noqa: E402
+import utils  # noqa: E402
+
+
+def _report(infos: Iterable[str]) -> None:
+    last = None
+    for info in infos:
+        if info.startswith("warning"):
+            print(info, file=sys.stderr)
+        elif info != last:
+            print(info)
+        last = info
+
+
+def _date(text: str) -> datetime.datetime:
+    return datetime.datetime.combine(datetime.date.fromisoformat(text), datetime.time())
+
+
+def _output(args: argparse.Namespace, default: str) -> pathlib.Path:
+    return args.output or utils.gen_download_file(default, "xlsx")
+
+
+def import_products(args: argparse.Namespace) -> None:
+    _report(utils.add_products(args.file))
+
+
+def import_sales(args: argparse.Namespace) -> None:
+    _report(utils.add_sales(args.store, args.files))
+
+
+def export_sales(args: argparse.Namespace) -> None:
+    end = args.to + datetime.timedelta(days=1, seconds=-1)
+    file = _output(args, f"Продажи {args.start:%d.%m.%y}-{args.to:%d.%m.%y}")
+    utils.df_to_xlsx(utils.get_df_sales(args.start, end), file)
+    print(file)
+
+
+def export_products(args: argparse.Namespace) -> None:
+    file = _output(args, "Данные о товарах")
+    utils.df_to_xlsx(utils.get_df_products(), file)
+    print(file)
+
+
+def _abc(
+    args: argparse.Namespace,
+) -> tuple[datetime.timedelta, str, tuple[float, float]]:
+    return datetime.timedelta(days=args.days), args.key, tuple(args.thresholds)
+
+
+def analyze(args: argparse.Namespace) -> None:
+    first, second = args.thresholds
+    a, b, c = utils.get_ABC(*_abc(args))
+    print(f"Динамика продаж: {round(utils.get_dynamic(), 2)}")
+    print(f"Класс А: {a}% товаров приносят {round(first * 100)}% прибыли")
+    print(f"Класс B: {b}% товаров приносят {round((second - first) * 100)}% прибыли")
+    print(f"Класс C: {c}% товаров приносят {round((1 - second) * 100)}% прибыли")
+
+
+def export_abc(args: argparse.Namespace) -> None:
+    file = _output(args, "ABC-XYZ анализ")
+    utils.df_to_xlsx(utils.get_df_abc(*_abc(args)), file)
+    print(file)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="wbtracker", description="WB Tracker без графического интерфейса"
+    )
+    commands = parser.add_subparsers(required=True, metavar="command")
+
+    command = commands.add_parser("import-products", help="загрузить артикулы")
+    command.add_argument("file", help="таблица: магазин+бренд, артикул, себестоимость")
+    command.set_defaults(run=import_products)
+
+    command = commands.add_parser("import-sales", help="загрузить отчеты о продажах")
+    command.add_argument("--store", choices=("wb", "ozon"), required=True)
+    command.add_argument("files", nargs="+")
+    command.set_defaults(run=import_sales)
+
+    command = commands.add_parser("export-sales", help="выгрузить продажи за период")
+    command.add_argument("--from", dest="start", type=_date, required=True)
+    command.add_argument("--to", type=_date, required=True)
+    command.add_argument("--output", "-o", type=pathlib.Path)
+    command.set_defaults(run=export_sales)
+
+    command = commands.add_parser("export-products", help="выгрузить товары")
+    command.add_argument("--output", "-o", type=pathlib.Path)
+    command.set_defaults(run=export_products)
+
+    abc = argparse.ArgumentParser(add_help=False)
+    abc.add_argument("--days", type=int, default=utils.PERIOD.days)
+    abc.add_argument("--key", choices=tuple(utils.KEYS), default="vendor_code")
+    abc.add_argument(
+        "--thresholds",
+        type=float,
+        nargs=2,
+        default=analysis.ABC,
+        metavar=("A", "B"),
+        help="доли прибыли, закрывающие классы A и B",
+    )
+
+    command = commands.add_parser(
+        "analyze", parents=[abc], help="динамика продаж и ABC-анализ"
+    )
+    command.set_defaults(run=analyze)
+
+    command = commands.add_parser(
+        "export-abc", parents=[abc], help="выгрузить ABC-XYZ классы товаров"
+    )
+    command.add_argument("--output", "-o", type=pathlib.Path)
+    command.set_defaults(run=export_abc)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import datetime
+from collections.abc import Sequence
+
+import dates
+import numpy as np
+import pandas as pd
+
+ABC = (0.8, 0.95)
+"""Shares of the total closing classes A and B, the rest is C."""
+
+XYZ = (0.1, 0.25)
+"""Coefficients of variation of monthly demand closing classes X and Y."""
+
+
+def period_months(
+    period: datetime.timedelta, now: datetime.datetime | None = None
+) -> list[int]:
+    # months that start within the period
+    now = now or datetime.datetime.now()
+    return list(range(dates.month_of(now - period) + 1, dates.month_of(now) + 1))
+
+
+def abc(
+    values: np.ndarray, thresholds: tuple[float, float] = ABC, labels: str = "ABC"
+) -> np.ndarray:
+    # the largest values up to the one reaching a threshold of the total
+    # make a class, the rest are left to the next one
+    values = np.asarray(values)
+    order = np.argsort(-values, kind="stable")
+    # running maximum, so that negative values keep it sorted
+    reached = np.maximum.accumulate(np.cumsum(values[order]))
+    targets = np.multiply(thresholds, values.sum())
+    bounds = np.maximum.accumulate(
+        np.where(targets > 0, reached.searchsorted(targets) + 1, 0)
+    )
+    ranks = np.empty(len(values), np.int64)
+    ranks[order] = np.arange(len(values))
+    return np.array(list(labels))[bounds.searchsorted(ranks, side="right")]
+
+
+def xyz(
+    variation: np.ndarray, thresholds: tuple[float, float] = XYZ, labels: str = "XYZ"
+) -> np.ndarray:
+    # no demand at all has an undefined variation and goes to the last class
+    return np.array(list(labels))[np.searchsorted(thresholds, variation)]
+
+
+def abc_xyz(
+    monthly: pd.DataFrame,
+    months: Sequence[int],
+    key: str | Sequence[str] = "vendor_code",
+    value: str = "profit",
+    abc_thresholds: tuple[float, float] = ABC,
+    xyz_thresholds: tuple[float, float] = XYZ,
+) -> pd.DataFrame:
+    keys = [key] if isinstance(key, str) else list(key)
+    monthly = monthly[monthly["month"].isin(months)]
+    result = monthly.groupby(keys, observed=True)[[value, "count"]].sum()
+    demand = (
+        monthly.groupby([*keys, "month"], observed=True)["count"]
+        .sum()
+        .unstack("month", fill_value=0)
+        .reindex(index=result.index, columns=months, fill_value=0)
+    )
+    result["variation"] = demand.std(axis=1, ddof=0) / demand.mean(axis=1)
+    result["abc"] = abc(result[value].to_numpy(), abc_thresholds)
+    result["xyz"] = xyz(result["variation"].to_numpy(), xyz_thresholds)
+    return result.sort_values(value, ascending=False, kind="stable").reset_index()
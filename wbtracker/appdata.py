@@ -1,3 +1,4 @@
+import os
 import pathlib
 import shutil
 import sys
@@ -13,9 +14,10 @@ elif sys.platform == "darwin":
 else:
     appdata = _home
 root = appdata / "WB Tracker"
-debug_root = pathlib.Path(".")
+debug_root = pathlib.Path(__file__).resolve().parent.parent
 
 DEBUG = False
+ENGINE = os.environ.get("WBTRACKER_ENGINE", "json")
 
 if DEBUG:
     root = debug_root
@@ -0,0 +1,112 @@
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class Column:
+
+    def __init__(self, dtype: type, values: np.ndarray | None = None) -> None:
+        self._data = np.asarray(values if values is not None else [], dtype=dtype)
+        self._size = len(self._data)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, row: int):
+        return self._data[: self._size][row]
+
+    def __setitem__(self, row: int, value) -> None:
+        if not self._data.flags.writeable:
+            self._data = self._data.copy()
+        self._data[: self._size][row] = value
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[: self._size]
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._data):
+            data = np.empty(max(size, 2 * len(self._data), 16), dtype=self._data.dtype)
+            data[: self._size] = self._data[: self._size]
+            self._data = data
+
+    def append(self, value) -> int:
+        self._reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, values: np.ndarray) -> None:
+        self._reserve(self._size + len(values))
+        self._data[self._size : self._size + len(values)] = values
+        self._size += len(values)
+
+
+class StringDict:
+
+    def __init__(self, strings: Iterable[str] = ()) -> None:
+        self._strings: list[str] = list(strings)
+        self._codes: dict[str, int] | None = None
+        self._array = np.empty(0, dtype=object)
+        self._dtype = pd.CategoricalDtype([])
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    @property
+    def strings(self) -> list[str]:
+        return self._strings
+
+    def _index(self) -> dict[str, int]:
+        if self._codes is None:
+            self._codes = {value: code for code, value in enumerate(self._strings)}
+        return self._codes
+
+    def find(self, string: str) -> int:
+        return self._index().get(string, -1)
+
+    def encode(self, string: str) -> int:
+        self._codes = self._index()
+        if (code := self._codes.get(string)) is None:
+            code = self._codes[string] = len(self._strings)
+            self._strings.append(string)
+        return code
+
+    def encode_many(self, strings: Sequence[str]) -> np.ndarray:
+        codes, uniques = pd.factorize(
+            np.asarray(strings, dtype=object), use_na_sentinel=False
+        )
+        index = self._index()
+        known = np.fromiter(
+            (index.get(string, -1) for string in uniques), np.int64, len(uniques)
+        )
+        new = uniques[known < 0].tolist()
+        known[known < 0] = np.arange(len(self._strings), len(self._strings) + len(new))
+        index.update(zip(new, range(len(self._strings), len(self._strings) + len(new))))
+        self._strings.extend(new)
+        return known[codes]
+
+    def intern(self, string: str) -> str:
+        return self._strings[self.encode(string)]
+
+    def decode(self, code: int) -> str:
+        return self._strings[code]
+
+    def decode_many(self, codes: np.ndarray) -> np.ndarray:
+        if len(self._array) != len(self._strings):
+            self._array = np.array(self._strings, dtype=object)
+        return self._array[codes]
+
+    @property
+    def dtype(self) -> pd.CategoricalDtype:
+        if len(self._dtype.categories) != len(self._strings):
+            self._dtype = pd.CategoricalDtype(pd.Index(self._strings, dtype=object))
+        return self._dtype
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, dtype=self.dtype)
@@ -0,0 +1,68 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+from columns import Column
+
+
+class Cube:
+    """Sale count and revenue per (store, id, month) cell.
+
+    Keys are codes of the sale table's string dictionaries; profit is not
+    kept, it depends on the product's current cost.
+    """
+
+    keys = ("store", "id", "month")
+    values = ("count", "revenue")
+    fields = keys + values
+
+    def __init__(self, arrays: dict[str, np.ndarray] | None = None) -> None:
+        arrays = arrays or {}
+        self._columns = {
+            field: Column(np.int64, arrays.get(field)) for field in self.fields
+        }
+        self._cells = dict(
+            zip(
+                zip(*(self._columns[field].values.tolist() for field in self.keys)),
+                itertools.count(),
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self._columns["count"])
+
+    def column(self, field: str) -> np.ndarray:
+        return self._columns[field].values
+
+    def _cells_of(self, index: pd.MultiIndex) -> np.ndarray:
+        keys = index.tolist()
+        cells = np.fromiter(
+            (self._cells.get(key, -1) for key in keys), np.int64, len(keys)
+        )
+        if len(new := np.flatnonzero(cells < 0)):
+            cells[new] = np.arange(len(self), len(self) + len(new))
+            for field in self.keys:
+                self._columns[field].extend(index.get_level_values(field)[new])
+            for field in self.values:
+                self._columns[field].extend(np.zeros(len(new), np.int64))
+            self._cells.update(zip(map(keys.__getitem__, new), cells[new].tolist()))
+        return cells
+
+    def add(
+        self,
+        store: np.ndarray,
+        id: np.ndarray,
+        month: np.ndarray,
+        price: np.ndarray,
+    ) -> None:
+        if not len(price):
+            return
+        groups = (
+            pd.DataFrame({"store": store, "id": id, "month": month, "price": price})
+            .groupby(list(self.keys), sort=False)["price"]
+            .agg(["size", "sum"])
+        )
+        cells = self._cells_of(groups.index)
+        for field, values in zip(self.values, (groups["size"], groups["sum"])):
+            column = self._columns[field]
+            column[cells] = column[cells] + values.to_numpy(np.int64)
@@ -1,7 +1,17 @@
-import json
+import datetime
+import itertools
+import threading
+from collections.abc import Generator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
 
 import appdata
+import dates
+import numpy as np
 import pandas as pd
+import storage
+from columns import Column, StringDict
+from cube import Cube
 
 
 class Database:
@@ -10,18 +20,42 @@ class Database:
 
         Key = tuple[str, str]
 
+        fields = ("store", "id", "vendor_code", "name", "price", "cost", "brand")
+
         def __init__(self, args: dict) -> None:
             self._store: str = args["store"]
             self._id: str = args["id"]
-            self.vendor_code: str = args["vendor_code"]
-            self.name: str = args["name"]
-            self.price: int = args["price"]
-            self.cost: int = args["cost"]
-            self.brand: str = args["brand"]
+            self._vendor_code: str = args["vendor_code"]
+            self._name: str = args["name"]
+            self._price: int = args["price"]
+            self._cost: int = args["cost"]
+            self._brand: str = args["brand"]
 
         def __eq__(self, value: object) -> bool:
             return isinstance(value, Database.Product) and self.key == value.key
 
+        # read-only: changes go through Database.update_product to be saved
+
+        @property
+        def vendor_code(self) -> str:
+            return self._vendor_code
+
+        @property
+        def name(self) -> str:
+            return self._name
+
+        @property
+        def price(self) -> int:
+            return self._price
+
+        @property
+        def cost(self) -> int:
+            return self._cost
+
+        @property
+        def brand(self) -> str:
+            return self._brand
+
         @property
         def args(self) -> dict:
             return {
@@ -42,25 +76,54 @@ class Database:
 
         Key = tuple[str, str, str, str]
 
+        __slots__ = ("_table", "_row", "_args")
+
         def __init__(self, args: dict) -> None:
-            self._store: str = args["store"]
-            self._sticker: str = args["sticker"]
-            self._id: str = args["id"]
-            self._date: str = args["date"]
-            self.price: int = args["price"]
+            self._table: Database.SaleTable | None = None
+            self._row: int = -1
+            self._args = {field: args[field] for field in Database.SaleTable.fields}
+
+        @classmethod
+        def _view(cls, table: "Database.SaleTable", row: int) -> "Database.Sale":
+            sale = cls.__new__(cls)
+            sale._table, sale._row, sale._args = table, row, {}
+            return sale
+
+        def _get(self, field: str):
+            if self._table is None:
+                return self._args[field]
+            return self._table.get(self._row, field)
 
         def __eq__(self, value: object) -> bool:
             return isinstance(value, Database.Sale) and self.key == value.key
 
+        @property
+        def _store(self) -> str:
+            return self._get("store")
+
+        @property
+        def _sticker(self) -> str:
+            return self._get("sticker")
+
+        @property
+        def _id(self) -> str:
+            return self._get("id")
+
+        @property
+        def _date(self) -> str:
+            return self._get("date")
+
+        @property
+        def timestamp(self) -> int:
+            return self._get("timestamp")
+
+        @property
+        def price(self) -> int:
+            return self._get("price")
+
         @property
         def args(self) -> dict:
-            return {
-                "store": self._store,
-                "sticker": self._sticker,
-                "id": self._id,
-                "date": self._date,
-                "price": self.price,
-            }
+            return {field: self._get(field) for field in Database.SaleTable.fields}
 
         @property
         def key(self) -> Key:
@@ -70,111 +133,552 @@ class Database:
         def product_key(self) -> "Database.Product.Key":
             return self._store, self._id
 
-    def __init__(self) -> None:
-        self._products = self._load_products()
-        self._sales = self._load_sales()
+    class Summary(NamedTuple):
+        added: int
+        skipped: int
+        updated: int
+        missing: list["Database.Product.Key"]
+
+    class SaleTable:
+
+        strings = ("store", "sticker", "id", "date")
+        numbers = ("timestamp", "price")
+        fields = strings + numbers
+
+        def __init__(
+            self,
+            strings: dict[str, list[str]] | None = None,
+            arrays: dict[str, np.ndarray] | None = None,
+        ) -> None:
+            strings, arrays = strings or {}, arrays or {}
+            self._dicts = {
+                field: StringDict(strings.get(field, ())) for field in self.strings
+            }
+            self._columns = {
+                field: Column(np.int64, arrays.get(field)) for field in self.fields
+            }
+            self._partition: tuple | None = None
+            self.seed()
+
+        def __len__(self) -> int:
+            return len(self._columns["price"])
+
+        def get(self, row: int, field: str) -> str | int:
+            value = int(self._columns[field][row])
+            return self._dicts[field].decode(value) if field in self._dicts else value
+
+        def extend(self, columns: dict[str, np.ndarray]) -> None:
+            for field in self.strings:
+                self._columns[field].extend(
+                    self._dicts[field].encode_many(columns[field])
+                )
+            for field in self.numbers:
+                self._columns[field].extend(columns[field])
+
+        def append(self, args: dict) -> int:
+            for field in self.strings:
+                self._columns[field].append(self._dicts[field].encode(args[field]))
+            for field in self.numbers:
+                self._columns[field].append(args[field])
+            return len(self) - 1
+
+        def find(self, field: str, string: str) -> int:
+            return self._dicts[field].find(string)
+
+        def codes(self, field: str) -> np.ndarray:
+            return self._columns[field].values
+
+        def categorical(
+            self, field: str, rows: np.ndarray | None = None
+        ) -> pd.Categorical:
+            codes = self._columns[field].values
+            return self._dicts[field].categorical(
+                codes if rows is None else codes[rows]
+            )
+
+        def column(self, field: str, rows: np.ndarray | None = None) -> np.ndarray:
+            values = self._columns[field].values
+            if rows is not None:
+                values = values[rows]
+            return (
+                self._dicts[field].decode_many(values)
+                if field in self._dicts
+                else values
+            )
+
+        def _partitions(
+            self,
+        ) -> tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+            # rows in time order, so a month is order[bounds[i]:bounds[i + 1]]
+            # and a period is found by binary search; timestamps never change,
+            # so only growth invalidates it
+            if self._partition is None or self._partition[0] != len(self):
+                order = np.argsort(self.codes("timestamp"), kind="stable")
+                timestamps = self.codes("timestamp")[order]
+                months, starts = np.unique(dates.months(timestamps), return_index=True)
+                self._partition = (
+                    len(self),
+                    order,
+                    timestamps,
+                    months,
+                    np.append(starts, len(self)),
+                )
+            return self._partition
+
+        def partitions(self) -> Generator[tuple[int, np.ndarray]]:
+            _, order, _, months, bounds = self._partitions()
+            for i, month in enumerate(months.tolist()):
+                yield month, np.sort(order[bounds[i] : bounds[i + 1]])
+
+        def rows(self, start: int | None = None, end: int | None = None) -> np.ndarray:
+            _, order, timestamps, _, _ = self._partitions()
+            first = 0 if start is None else timestamps.searchsorted(start)
+            last = (
+                len(timestamps)
+                if end is None
+                else timestamps.searchsorted(end, side="right")
+            )
+            return np.sort(order[first:last])
+
+        def seed(self, cells: dict[str, list] | None = None, rows: int = 0) -> None:
+            # cells aggregate the first rows, the rest are folded in on demand
+            if cells is None:
+                self._cube, self._aggregated = Cube(), 0
+                return
+            self._cube = Cube(
+                {
+                    field: (
+                        self._dicts[field].encode_many(cells[field])
+                        if field in self._dicts
+                        else np.asarray(cells[field], dtype=np.int64)
+                    )
+                    for field in Cube.fields
+                }
+            )
+            self._aggregated = rows
+
+        def cube(self) -> Cube:
+            if self._aggregated < len(self):
+                start = self._aggregated
+                self._cube.add(
+                    self.codes("store")[start:],
+                    self.codes("id")[start:],
+                    dates.months(self.codes("timestamp")[start:]),
+                    self.codes("price")[start:],
+                )
+                self._aggregated = len(self)
+            return self._cube
+
+        def aggregates(self) -> dict[str, list]:
+            cube = self.cube()
+            return {
+                field: (
+                    self._dicts[field].decode_many(cube.column(field))
+                    if field in self._dicts
+                    else cube.column(field)
+                ).tolist()
+                for field in Cube.fields
+            }
 
-    def _load_products(self) -> list[Product]:
-        with open(appdata.root / "data" / "database" / "products.json", "r") as fp:
-            return [Database.Product(args) for args in json.load(fp)["products"]]
+        def records(self, rows: np.ndarray | None = None) -> list[dict]:
+            columns = [self.column(field, rows).tolist() for field in self.fields]
+            return [dict(zip(self.fields, row)) for row in zip(*columns)]
 
-    def _save_products(self) -> None:
-        with open(appdata.root / "data" / "database" / "products.json", "w") as fp:
-            json.dump({"products": [product.args for product in self._products]}, fp)
+        def snapshot(self) -> tuple[dict[str, list[str]], dict[str, np.ndarray]]:
+            return (
+                {field: self._dicts[field].strings for field in self.strings},
+                {field: self._columns[field].values for field in self.fields},
+            )
 
-    def _load_sales(self) -> list[Sale]:
-        with open(appdata.root / "data" / "database" / "sales.json", "r") as fp:
-            return [Database.Sale(args) for args in json.load(fp)["sales"]]
+        def keys(self) -> list["Database.Sale.Key"]:
+            return list(zip(*(self.column(field).tolist() for field in self.strings)))
 
-    def _save_sales(self) -> None:
-        with open(appdata.root / "data" / "database" / "sales.json", "w") as fp:
-            json.dump({"sales": [sale.args for sale in self._sales]}, fp)
+    def __init__(self, backend: storage.Storage | None = None) -> None:
+        self._storage = backend or storage.open_storage(
+            appdata.ENGINE, appdata.root / "data" / "database"
+        )
+        self._changes: list[dict] = []
+        self._version = 0
+        with self._storage.lock():
+            self._load()
+        if self._storage.needs_compaction():
+            self.compact()
+
+    def _load(self) -> None:
+        self._products: dict[Database.Product.Key, Database.Product] = {}
+        self._sales = Database.SaleTable(*(self._storage.snapshot() or ()))
+        self._strings = self._sales._dicts | {
+            field: StringDict() for field in ("vendor_code", "name", "brand")
+        }
+        self._sale_index: dict[Database.Sale.Key, int] | None = None
+        records = self._storage.load()
+        if aggregates := self._storage.aggregates():
+            self._sales.seed(*aggregates)
+        for record in records:
+            self._apply(record)
+        if self._sales._aggregated > len(self._sales):
+            # the snapshot lost rows since it was aggregated
+            self._sales.seed()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def _index(self) -> dict[Sale.Key, int]:
+        if self._sale_index is None:
+            self._sale_index = {key: row for row, key in enumerate(self._sales.keys())}
+        return self._sale_index
+
+    def _refresh(self) -> bool:
+        if self._storage.stale():
+            # another process compacted: reload and replay what is not saved yet
+            self._version += 1
+            self._load()
+            for record in self._changes:
+                self._apply(record)
+            return True
+        updated = False
+        for record in self._storage.updates():
+            updated |= self._apply(record)
+        return updated
+
+    def refresh(self) -> bool:
+        with self._storage.lock():
+            return self._refresh()
+
+    def rollback(self) -> None:
+        """Forget the changes that are not saved yet."""
+        with self._storage.lock():
+            self._changes = []
+            self._version += 1
+            self._load()
 
     def save(self) -> None:
-        self._save_products()
-        self._save_sales()
+        with self._storage.lock(exclusive=True):
+            self._refresh()
+            self._storage.save(self._changes)
+            self._changes = []
+            if self._storage.needs_compaction():
+                self.compact_to(self._storage)
+
+    def compact(self) -> None:
+        with self._storage.lock(exclusive=True):
+            self._refresh()
+            self._storage.save(self._changes)
+            self._changes = []
+            self.compact_to(self._storage)
+
+    def compact_to(self, target: storage.Storage) -> None:
+        with target.lock(exclusive=True):
+            target.compact(
+                [product.args for product in self._products.values()], self._sales
+            )
+
+    def _apply(self, record: dict) -> bool:
+        if record["op"] == "product":
+            return self._add_product(Database.Product(record["args"]))
+        elif record["op"] == "sale":
+            return self._add_sale(record["args"])
+        elif record["op"] == "sales":
+            return bool(self._add_sales(record["columns"]).any())
+        elif record["op"] == "update":
+            return bool(self._update_product(tuple(record["key"]), record["fields"]))
+        raise ValueError(f"unknown journal record: {record['op']}")
+
+    def _intern(self, fields: dict) -> dict:
+        return {
+            field: (
+                self._strings[field].intern(value)
+                if field in self._strings and isinstance(value, str)
+                else value
+            )
+            for field, value in fields.items()
+        }
+
+    def _add_product(self, product: Product) -> bool:
+        if product.key in self._products:
+            return False
+        self._products[product.key] = Database.Product(self._intern(product.args))
+        self._version += 1
+        return True
+
+    def _add_sale(self, args: dict) -> bool:
+        key = args["store"], args["sticker"], args["id"], args["date"]
+        if key in self._index:
+            return False
+        self._index[key] = self._sales.append(args)
+        self._version += 1
+        return True
+
+    def _add_sales(self, columns: dict) -> np.ndarray:
+        columns = {
+            field: np.asarray(
+                columns[field],
+                dtype=object if field in Database.SaleTable.strings else np.int64,
+            )
+            for field in Database.SaleTable.fields
+        }
+        keys = list(zip(*(columns[field] for field in Database.SaleTable.strings)))
+        index = self._index
+        added = ~np.fromiter(map(index.__contains__, keys), bool, len(keys))
+        first = dict(zip(reversed(keys), reversed(range(len(keys)))))
+        if len(first) < len(keys):
+            unique = np.zeros(len(keys), bool)
+            unique[list(first.values())] = True
+            added &= unique
+        if not added.any():
+            return added
+        start = len(self._sales)
+        self._sales.extend({field: values[added] for field, values in columns.items()})
+        index.update(zip(itertools.compress(keys, added), itertools.count(start)))
+        self._version += 1
+        return added
+
+    def _update_product(self, key: Product.Key, fields: dict) -> dict:
+        if not (product := self.find_product(key)):
+            return {}
+        fields = self._intern(fields)
+        fields = {
+            field: value
+            for field, value in fields.items()
+            if getattr(product, field) != value
+        }
+        for field, value in fields.items():
+            setattr(product, f"_{field}", value)
+        if fields:
+            self._version += 1
+        return fields
 
     def add_product(self, product: Product) -> None:
-        if product not in self._products:
-            self._products.append(product)
+        if self._add_product(product):
+            self._changes.append({"op": "product", "args": product.args})
 
     def add_sale(self, sale: Sale) -> None:
-        if sale not in self._sales:
-            self._sales.append(sale)
+        if self._add_sale(args := sale.args):
+            self._changes.append({"op": "sale", "args": args})
+
+    def update_product(self, key: Product.Key, **fields) -> bool:
+        if fields := self._update_product(key, fields):
+            self._changes.append({"op": "update", "key": list(key), "fields": fields})
+        return bool(fields)
+
+    def add_products_bulk(
+        self,
+        products: pd.DataFrame | dict[str, Sequence],
+        update: Sequence[str] = ("cost",),
+    ) -> Summary:
+        frame = pd.DataFrame(products)
+        added = updated = 0
+        for args in frame.drop_duplicates(["store", "id"], keep="last").to_dict(
+            "records"
+        ):
+            product = Database.Product(args)
+            if self.find_product(product.key):
+                updated += self.update_product(
+                    product.key, **{field: args[field] for field in update}
+                )
+            else:
+                self.add_product(product)
+                added += 1
+        return Database.Summary(added, len(frame) - added - updated, updated, [])
+
+    def add_sales_bulk(self, sales: pd.DataFrame | dict[str, Sequence]) -> Summary:
+        frame = pd.DataFrame(sales)
+        columns = {
+            field: frame[field].to_numpy() for field in Database.SaleTable.fields
+        }
+        if (added := self._add_sales(columns)).any():
+            self._changes.append(
+                {
+                    "op": "sales",
+                    "columns": {
+                        field: values[added].tolist()
+                        for field, values in columns.items()
+                    },
+                }
+            )
+        _, _, updated, missing = self.update_sold_products(frame)
+        return Database.Summary(
+            int(added.sum()), len(frame) - int(added.sum()), updated, missing
+        )
+
+    def update_sold_products(
+        self, sales: pd.DataFrame | dict[str, Sequence]
+    ) -> Summary:
+        frame = pd.DataFrame(sales)
+        fields = [field for field in ("name", "vendor_code", "price") if field in frame]
+        updated = 0
+        missing: list[Database.Product.Key] = []
+        for args in (
+            frame[["store", "id", *fields]]
+            .drop_duplicates(["store", "id"], keep="last")
+            .to_dict("records")
+        ):
+            key = args.pop("store"), args.pop("id")
+            if self.find_product(key):
+                updated += self.update_product(key, **args)
+            else:
+                missing.append(key)
+        return Database.Summary(0, 0, updated, missing)
 
     def find_product(self, key: Product.Key) -> Product | None:
-        for product in self._products:
-            if key == product.key:
-                return product
-        return None
+        return self._products.get(key)
 
     def find_sale(self, key: Sale.Key) -> Sale | None:
-        for sale in self._sales:
-            if key == sale.key:
-                return sale
-        return None
+        if (row := self._index.get(key)) is None:
+            return None
+        return Database.Sale._view(self._sales, row)
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+_future: Future[Database] | None = None
+_lock = threading.Lock()
+_full: tuple[tuple, pd.DataFrame] | None = None
+
+
+def load() -> Future[Database]:
+    global _future
+    with _lock:
+        if _future is None:
+            _future = _executor.submit(Database)
+        return _future
 
 
-db = Database()
+def get_db() -> Database:
+    db = load().result()
+    db.refresh()
+    return db
+
+
+def convert(source: str, target: str) -> None:
+    root = appdata.root / "data" / "database"
+    Database(storage.open_storage(source, root)).compact_to(
+        storage.open_storage(target, root)
+    )
+
+
+def _product_column(
+    db: Database, products: list[dict], field: str, rows: np.ndarray | None = None
+) -> pd.Categorical | np.ndarray:
+    values = [product[field] for product in products]
+    if field in db._strings:
+        codes = db._strings[field].encode_many(values)
+        return db._strings[field].categorical(codes if rows is None else codes[rows])
+    array = np.array(values, dtype=np.int64)
+    return array if rows is None else array[rows]
 
 
 def get_products() -> pd.DataFrame:
+    db = get_db()
+    products = [product.args for product in db._products.values()]
     return pd.DataFrame(
-        [
-            [
-                product._store,
-                product._id,
-                product.vendor_code,
-                product.brand,
-                product.name,
-                product.price,
-                product.cost,
-            ]
-            for product in db._products
-        ],
-        columns=["store", "id", "vendor_code", "brand", "name", "price", "cost"],
+        {
+            field: _product_column(db, products, field)
+            for field in (
+                "store",
+                "id",
+                "vendor_code",
+                "brand",
+                "name",
+                "price",
+                "cost",
+            )
+        }
     )
 
 
 def get_sales() -> pd.DataFrame:
+    sales = get_db()._sales
     return pd.DataFrame(
-        [
-            [sale._store, sale._sticker, sale._id, sale._date, sale.price]
-            for sale in db._sales
-        ],
-        columns=["store", "sticker", "id", "date", "price"],
+        {
+            field: (
+                sales.categorical(field)
+                if field in Database.SaleTable.strings
+                else sales.codes(field)
+            )
+            for field in Database.SaleTable.fields
+        }
     )
 
 
-def get_full() -> pd.DataFrame:
-    products = {product.key: product for product in db._products}
-    res = []
-    for sale in db._sales:
-        if sale.product_key not in products:
-            continue
-        product = products[sale.product_key]
-        res.append(
-            [
-                sale._store,
-                sale._id,
-                product.vendor_code,
-                product.brand,
-                product.name,
-                sale._date,
-                sale.price,
-                product.cost,
-            ]
-        )
+def _product_rows(
+    db: Database, stores: np.ndarray, ids: np.ndarray
+) -> tuple[list[dict], np.ndarray]:
+    sales = db._sales
+    size = len(db._strings["id"])
+    products: list[dict] = []
+    product_keys: list[int] = []
+    for product in db._products.values():
+        store, id = sales.find("store", product._store), sales.find("id", product._id)
+        if store >= 0 and id >= 0:
+            products.append(product.args)
+            product_keys.append(store * size + id)
+    return products, pd.Index(product_keys, dtype=np.int64).get_indexer(
+        stores * size + ids
+    )
+
+
+def _join(db: Database, rows: np.ndarray | None = None) -> pd.DataFrame:
+    sales = db._sales
+    if rows is None:
+        rows = np.arange(len(sales))
+    products, product_rows = _product_rows(
+        db, sales.codes("store")[rows], sales.codes("id")[rows]
+    )
+    matched = product_rows >= 0
+    rows, product_rows = rows[matched], product_rows[matched]
     return pd.DataFrame(
-        res,
-        columns=[
-            "store",
-            "id",
-            "vendor_code",
-            "brand",
-            "name",
-            "date",
-            "price",
-            "cost",
-        ],
+        {
+            "store": sales.categorical("store", rows),
+            "id": sales.categorical("id", rows),
+            "vendor_code": _product_column(db, products, "vendor_code", product_rows),
+            "brand": _product_column(db, products, "brand", product_rows),
+            "name": _product_column(db, products, "name", product_rows),
+            "date": sales.categorical("date", rows),
+            "timestamp": sales.column("timestamp", rows),
+            "price": sales.column("price", rows),
+            "cost": _product_column(db, products, "cost", product_rows),
+        }
+    )
+
+
+def get_full(
+    start: datetime.datetime | None = None, end: datetime.datetime | None = None
+) -> pd.DataFrame:
+    global _full
+    db = get_db()
+    # the last join, so that the same period is not joined again
+    key = db.version, start, end
+    if _full is None or _full[0] != key:
+        _full = key, _join(
+            db,
+            db._sales.rows(
+                None if start is None else dates.to_timestamp(start),
+                None if end is None else dates.to_timestamp(end),
+            ),
+        )
+    return _full[1].copy()
+
+
+def get_monthly() -> pd.DataFrame:
+    db = get_db()
+    cube = db._sales.cube()
+    products, product_rows = _product_rows(db, cube.column("store"), cube.column("id"))
+    cells = np.flatnonzero(product_rows >= 0)
+    product_rows = product_rows[cells]
+    monthly = pd.DataFrame(
+        {
+            "store": db._strings["store"].categorical(cube.column("store")[cells]),
+            "id": db._strings["id"].categorical(cube.column("id")[cells]),
+            "vendor_code": _product_column(db, products, "vendor_code", product_rows),
+            "brand": _product_column(db, products, "brand", product_rows),
+            "name": _product_column(db, products, "name", product_rows),
+            "month": cube.column("month")[cells],
+            "count": cube.column("count")[cells],
+            "revenue": cube.column("revenue")[cells],
+            "cost": _product_column(db, products, "cost", product_rows),
+        }
     )
+    monthly["profit"] = monthly["revenue"] - monthly["cost"] * monthly["count"]
+    return monthly
@@ -0,0 +1,71 @@
+import datetime
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+WB_FORMAT = "%H:%M:%S %d.%m.%Y"
+OZON_FORMAT = "%Y-%m-%d %H:%M:%S"
+FORMATS = (WB_FORMAT, OZON_FORMAT)
+
+NO_DATE = int(np.iinfo(np.int64).min)
+"""Timestamp of a date that could not be parsed (NaT as datetime64)."""
+
+
+def to_timestamp(date: datetime.datetime) -> int:
+    return int(np.datetime64(date, "s").astype(np.int64))
+
+
+def parse_date(date: str, formats: Sequence[str] = FORMATS) -> int:
+    for format in formats:
+        try:
+            return to_timestamp(datetime.datetime.strptime(date, format))
+        except ValueError:
+            pass
+    return NO_DATE
+
+
+def preferring(format: str) -> list[str]:
+    return [format, *(other for other in FORMATS if other != format)]
+
+
+def parse_dates(dates: Sequence[str], formats: Sequence[str] = FORMATS) -> np.ndarray:
+    series = pd.Series(dates, dtype=object)
+    res = np.full(len(series), NO_DATE, dtype=np.int64)
+    for format in formats:
+        # later formats only for the dates the earlier ones did not parse
+        if not (missing := res == NO_DATE).any():
+            break
+        parsed = pd.to_datetime(series[missing], format=format, errors="coerce")
+        res[missing] = parsed.to_numpy().astype("datetime64[s]").view(np.int64)
+    return res
+
+
+def months(timestamps: np.ndarray) -> np.ndarray:
+    return (
+        np.asarray(timestamps, dtype=np.int64)
+        .view("datetime64[s]")
+        .astype("datetime64[M]")
+        .view(np.int64)
+    )
+
+
+def month_start(months: np.ndarray) -> np.ndarray:
+    return (
+        np.asarray(months, dtype=np.int64)
+        .view("datetime64[M]")
+        .astype("datetime64[s]")
+        .view(np.int64)
+    )
+
+
+def month_of(date: datetime.date) -> int:
+    return (date.year - 1970) * 12 + date.month - 1
+
+
+def month_date(month: int) -> datetime.datetime:
+    return datetime.datetime(1970 + month // 12, month % 12 + 1, 1)
+
+
+def month_label(month: int, format: str = "%m.%y") -> str:
+    return month_date(month).strftime(format)
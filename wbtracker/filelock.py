@@ -0,0 +1,68 @@
+import contextlib
+import os
+import pathlib
+import sys
+import threading
+from collections.abc import Generator
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """Advisory lock shared by readers or held by a single writer.
+
+    Reentrant within a thread; Windows has no shared locks, so readers take
+    the exclusive one there.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._path = path
+        self._thread_lock = threading.RLock()
+        self._fd: int | None = None
+        self._exclusive = False
+        self._depth = 0
+
+    def _acquire(self, exclusive: bool) -> None:
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT)
+        try:
+            if sys.platform == "win32":
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after 10 seconds
+                        pass
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd, self._exclusive = fd, exclusive
+
+    def _release(self) -> None:
+        if sys.platform == "win32":
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    @contextlib.contextmanager
+    def __call__(self, exclusive: bool = False) -> Generator[None]:
+        with self._thread_lock:
+            if not self._depth:
+                self._acquire(exclusive)
+            elif exclusive and not self._exclusive:
+                raise RuntimeError(f"{self._path}: cannot upgrade a shared lock")
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self._release()
@@ -0,0 +1,454 @@
+import calendar
+import datetime
+import threading
+import time
+import weakref
+from collections.abc import Callable
+from typing import Generator
+
+import database
+import pyglet
+import utils
+from win import *
+
+WBC = (148, 0, 216)
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+
+class ListSwitcher(WinBlock):
+
+    def __init__(self, options: list[str], x: int, y: int, length: int) -> None:
+        super().__init__()
+        self._options = options
+        self._ind = 0
+        weak_self = weakref.proxy(self)
+        self["left"] = TextButton(
+            Shape.RoundedRectangle(x, y, 40, 40, 5, color=WBC),
+            Text.Label("<", font_size=14),
+            lambda: weak_self._left(),
+        )
+        self["right"] = TextButton(
+            Shape.RoundedRectangle(x + 40 + length, y, 40, 40, 5, color=WBC),
+            Text.Label(">", font_size=14),
+            lambda: weak_self._right(),
+        )
+        self["option"] = Text(
+            Text.Label(
+                "",
+                x + 40,
+                y + 13,
+                0,
+                length,
+                40,
+                align="center",
+                color=BLACK,
+                font_size=14,
+            )
+        )
+        self._update_option()
+
+    @property
+    def option(self) -> Text:
+        assert isinstance(res := self["option"], Text)
+        return res
+
+    def _update_option(self) -> None:
+        self.option.label.text = self._options[self._ind]
+
+    def _left(self) -> None:
+        self._ind = (self._ind - 1) % len(self._options)
+        self._update_option()
+
+    def _right(self) -> None:
+        self._ind = (self._ind + 1) % len(self._options)
+        self._update_option()
+
+
+class Menu(WinBlock):
+
+    def __init__(self, window: "Window", buttons: list[tuple[str, Callable]]) -> None:
+        super().__init__()
+        window["menu"] = self
+        for n, button in enumerate(buttons):
+            i, j = n // 2, n % 2
+            self[f"{i}-{j}"] = TextButton(
+                Shape.RoundedRectangle(
+                    100 + j * 250,
+                    650 - 80 * i,
+                    200,
+                    50,
+                    10,
+                    color=WBC,
+                ),
+                Text.Label(button[0], font_size=14),
+                button[1],
+            )
+
+
+class Info(Text):
+
+    interval = 0.25
+    """Seconds between label updates, relayouting it per row is slow."""
+
+    def __init__(self, window: "Window") -> None:
+        super().__init__(Text.Label("", 30, 30, color=BLACK))
+        window["output"] = self
+        self._window = window
+        self._text = ""
+        self._shown = 0.0
+
+    @property
+    def info(self) -> str:
+        return self._text
+
+    @info.setter
+    def info(self, text: str) -> None:
+        pending = self._text != self.label.text
+        self._text = text
+        if (wait := self._shown + self.interval - time.perf_counter()) <= 0:
+            self._show()
+        elif not pending:
+            pyglet.clock.schedule_once(self._show, wait)
+
+    def _show(self, dt: float = 0) -> None:
+        pyglet.clock.unschedule(self._show)
+        self.label.text = self._text
+        self._shown = time.perf_counter()
+
+
+class MainWindow(Window):
+
+    def __init__(self) -> None:
+        super().__init__(1080, 720, "WB Tracker")
+        self._database = database.load()
+        self.set_icon(Image.load("icon.png"))
+        self._background = Background(self, WHITE)
+        self["top-line"] = Shape(Shape.Line(0, 720, 1080, 720, 3, WBC))
+        self._menu = Menu(
+            self,
+            [
+                ("Добавить артикулы", lambda: self.loading(self._add_products)),
+                ("Добавить продажи", self._add_sales),
+                ("Выгрузить товары", lambda: self.loading(self._download_products)),
+                ("Выгрузить продажи", self._download_sales),
+                ("Построить график", lambda: self.loading(self._build_plot)),
+            ],
+        )
+        self._output = Info(self)
+        self._input_field = Input(
+            self,
+            Shape.RoundedRectangle(
+                350,
+                490,
+                200,
+                50,
+                10,
+                color=WBC,
+            ),
+            Text.Label(font_size=14),
+            "введите артикул...",
+        )
+        self["input"] = self._input_field
+        self["analyze"] = TextButton(
+            Shape.RoundedRectangle(
+                100,
+                650 - 80 * 3,
+                200,
+                50,
+                10,
+                color=WBC,
+            ),
+            Text.Label("Анализ", font_size=14),
+            lambda: self.loading(self._analyze),
+        )
+        self["full"] = TextButton(
+            Shape.RoundedRectangle(
+                100 + 250,
+                650 - 80 * 3,
+                200,
+                50,
+                10,
+                color=WBC,
+            ),
+            Text.Label("Полный отчет", font_size=14),
+            lambda: self.loading(self._full),
+        )
+
+    def _wait_database(self) -> Generator:
+        if self._database.done():
+            return
+        info = self._output.info
+        self._output.info = "загрузка базы данных..."
+        yield self._database
+        self._output.info = info
+
+    def on_progress(self, message: str) -> None:
+        self._output.info = message
+
+    def _open(self, file: str) -> None:
+        # the opener waits for its process, keep it off the UI and the worker
+        threading.Thread(target=utils.appopen, args=(file,), daemon=True).start()
+
+    def _clear_body(self) -> None:
+        self["body"] = None
+        self.on_draw()
+
+    def _add_products(self) -> Generator:
+        self._clear_body()
+        self._output.info = "загрузка..."
+        self.need_redraw()
+        yield
+        yield from self._wait_database()
+        infos: list[str] = []
+        if paths := utils.ask_files():
+            yield (future := self.background_iter(utils.add_products, paths[0]))
+            infos = future.result()
+        warnings = [info for info in infos if info.startswith("warning")]
+        self._output.info = "загрузка артикулов завершена"
+        if warnings:
+            self._clear_body()
+            self["body"] = Text(
+                Text.Label(
+                    "\n".join(
+                        [f"{len(warnings)} предупреждений. Первые из них:\n"]
+                        + warnings[:10]
+                    ),
+                    100,
+                    350,
+                    width=800,
+                    font_size=14,
+                    color=BLACK,
+                    multiline=True,
+                ),
+            )
+        yield
+
+    def _add_sales(self) -> None:
+        self._clear_body()
+        body = WinBlock()
+        self["body"] = body
+        body["wb"] = TextButton(
+            Shape.RoundedRectangle(600, 585, 100, 100, 10, color=WBC),
+            Text.Label("WB", font_size=14),
+            lambda: self.loading(lambda: self._add_sales_from("wb")),
+        )
+        body["ozon"] = TextButton(
+            Shape.RoundedRectangle(750, 585, 100, 100, 10, color=(71, 0, 254)),
+            Text.Label("OZON", font_size=14),
+            lambda: self.loading(lambda: self._add_sales_from("ozon")),
+        )
+        body["imports"] = TextButton(
+            Shape.RoundedRectangle(900, 585, 100, 100, 10, color=WBC),
+            Text.Label("История", font_size=14),
+            self._imports,
+        )
+
+    def _imports(self) -> None:
+        self._clear_body()
+        self["body"] = Text(
+            Text.Label(
+                "\n".join(["Загруженные отчеты:\n"] + utils.imports()[-10:]),
+                100,
+                350,
+                width=800,
+                font_size=14,
+                color=BLACK,
+                multiline=True,
+            ),
+        )
+
+    def _add_sales_from(self, store: str) -> Generator:
+        self._clear_body()
+        self._output.info = "загрузка..."
+        self.need_redraw()
+        yield
+        yield from self._wait_database()
+        infos: list[str] = []
+        if paths := utils.ask_files(multiple=True):
+            yield (future := self.background_iter(utils.add_sales, store, paths))
+            infos = future.result()
+        warnings = [info for info in infos if info.startswith("warning")]
+        self._output.info = "загрузка продаж завершена"
+        if warnings:
+            self._clear_body()
+            self["body"] = Text(
+                Text.Label(
+                    "\n".join(
+                        [f"{len(warnings)} предупреждений. Первые из них:\n"]
+                        + warnings[:10]
+                    ),
+                    100,
+                    350,
+                    width=800,
+                    font_size=14,
+                    color=BLACK,
+                    multiline=True,
+                ),
+            )
+        yield
+
+    def _download_products(self) -> Generator:
+        self._clear_body()
+        self._output.info = "выгрузка..."
+        self.need_redraw()
+        yield
+        yield from self._wait_database()
+        yield (future := self.background(utils.download_products))
+        file = future.result()
+        self._output.info = f"выгрузка товаров завершена ({file})"
+        yield
+        self._open(file)
+
+    def _download_sales(self) -> None:
+        self._clear_body()
+        self["body"] = (body := WinBlock())
+        body["year"] = ListSwitcher(
+            list(map(str, list(range(2025, 3000)) + list(range(2000, 2025)))),
+            630,
+            640,
+            160,
+        )
+        body["month"] = ListSwitcher(utils.month_names, 630, 570, 160)
+        body["for_year"] = TextButton(
+            Shape.RoundedRectangle(100 + 500, 100 + 400, 100, 40, 10, color=WBC),
+            Text.Label("За год", font_size=14),
+            lambda: self.loading(self._download_sales_for_year),
+        )
+        body["or"] = Text(
+            Text.Label("или", 230 + 500, 115 + 400, color=BLACK, font_size=14)
+        )
+        body["for_month"] = TextButton(
+            Shape.RoundedRectangle(300 + 500, 100 + 400, 100, 40, 10, color=WBC),
+            Text.Label("За месяц", font_size=14),
+            lambda: self.loading(self._download_sales_for_month),
+        )
+
+    def _download_sales_for_year(self) -> Generator:
+        assert isinstance(body := self["body"], WinBlock)
+        assert isinstance(year_option := body["year"], ListSwitcher)
+        year = int(year_option.option.label.text)
+        start = datetime.datetime(year, 1, 1)
+        end = datetime.datetime(year + 1, 1, 1) + datetime.timedelta(seconds=-1)
+        return self._download_sales_for_period(start, end, f"Продажи {year}")
+
+    def _download_sales_for_month(self) -> Generator:
+        assert isinstance(body := self["body"], WinBlock)
+        assert isinstance(year_option := body["year"], ListSwitcher)
+        assert isinstance(month_option := body["month"], ListSwitcher)
+        year, month = int(year_option.option.label.text), month_option._ind + 1
+        start = datetime.datetime(year, month, 1)
+        end = start + datetime.timedelta(
+            days=calendar.monthrange(year, month)[1], seconds=-1
+        )
+        return self._download_sales_for_period(
+            start, end, f"Продажи {month // 10}{month % 10}.{year % 100}"
+        )
+
+    def _download_sales_for_period(
+        self, start: datetime.datetime, end: datetime.datetime, filename: str
+    ) -> Generator:
+        self._clear_body()
+        self._output.info = "выгрузка..."
+        self.need_redraw()
+        yield
+        yield from self._wait_database()
+        yield (future := self.background(utils.download_sales, start, end, filename))
+        file = future.result()
+        self._output.info = f"выгрузка товаров завершена ({file})"
+        self._open(file)
+        yield
+
+    def _build_plot(self) -> Generator:
+        yield
+        yield from self._wait_database()
+        yield (future := self.background(utils.plot_data, self._input_field.text))
+        utils.show_plot(*future.result())
+        yield
+
+    def _analyze(self) -> Generator:
+        self._clear_body()
+        self["body"] = (body := WinBlock())
+        self._output.info = "начинаем анализ..."
+        self.need_redraw()
+        yield
+        yield from self._wait_database()
+        dynamic = self.background(utils.get_dynamic)
+        abc = self.background(utils.get_ABC)
+        yield dynamic
+        dynamic = dynamic.result()
+        body["pop"] = Text(
+            Text.Label(
+                f"Динамика продаж: {round(dynamic, 2)}",
+                100,
+                300,
+                font_size=14,
+                color=BLACK,
+            )
+        )
+        yield abc
+        a, b, c = abc.result()
+        body["a"] = Text(
+            Text.Label(
+                f"Класс А: {a}% товаров приносят 80% прибыли",
+                100,
+                250,
+                font_size=14,
+                color=BLACK,
+            )
+        )
+        body["b"] = Text(
+            Text.Label(
+                f"Класс B: {b}% товаров приносят 15% прибыли",
+                100,
+                200,
+                font_size=14,
+                color=BLACK,
+            )
+        )
+        body["c"] = Text(
+            Text.Label(
+                f"Класс C: {c}% товаров приносят 5% прибыли",
+                100,
+                150,
+                font_size=14,
+                color=BLACK,
+            )
+        )
+        body["download"] = TextButton(
+            Shape.RoundedRectangle(100 + 250 * 2, 650 - 80 * 3, 200, 50, 10, color=WBC),
+            Text.Label("Классы ABC-XYZ", font_size=14),
+            lambda: self.loading(self._download_abc),
+        )
+        yield
+        self._output.info = "анализ успешно завершился"
+
+    def _download_abc(self) -> Generator:
+        self._output.info = "выгрузка..."
+        self.need_redraw()
+        yield
+        yield (future := self.background(utils.download_abc, "ABC-XYZ анализ"))
+        file = future.result()
+        self._output.info = f"выгрузка классов завершена ({file})"
+        self._open(file)
+        yield
+
+    def _full(self) -> Generator:
+        self._clear_body()
+        self._output.info = "выгрузка..."
+        self.need_redraw()
+        yield
+        yield from self._wait_database()
+        yield (future := self.background(utils.download_full, "Полный отчет"))
+        file = future.result()
+        self._output.info = f"выгрузка товаров завершена ({file})"
+        self._open(file)
+        yield
+
+
+def main():
+    MainWindow().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import os
+import pathlib
+from collections.abc import Generator
+
+
+class Journal:
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._path = path
+        self._records = 0
+        self._offset = 0
+
+    def __len__(self) -> int:
+        return self._records
+
+    @property
+    def size(self) -> int:
+        return self._offset
+
+    def read(self) -> Generator[dict]:
+        if not self._path.exists():
+            return
+        with open(self._path, "rb") as fp:
+            fp.seek(self._offset)
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self._offset += len(line)
+                self._records += 1
+                yield record
+        if self._path.stat().st_size > self._offset:
+            # drop a record torn by a crash mid-append
+            with open(self._path, "rb+") as fp:
+                fp.truncate(self._offset)
+
+    def append(self, records: list[dict]) -> None:
+        if not records:
+            return
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with open(self._path, "ab") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        self._offset += len(data)
+        self._records += len(records)
+
+    def clear(self) -> None:
+        self._path.unlink(missing_ok=True)
+        self._records = 0
+        self._offset = 0
@@ -0,0 +1,91 @@
+import datetime
+import json
+import pathlib
+from typing import NamedTuple
+
+import appdata
+import dates
+import storage
+from filelock import FileLock
+
+
+class Ledger:
+    """Reports already imported, kept next to the database."""
+
+    class Entry(NamedTuple):
+        fingerprint: str
+        store: str
+        name: str
+        start: int
+        end: int
+        rows: int
+        added: int
+        imported: int
+
+        def describe(self) -> str:
+            if not self.rows:
+                return f"{self.name} (нет продаж)"
+            if self.start == dates.NO_DATE:
+                return f"{self.name} (без дат)"
+            start, end = (
+                datetime.datetime.fromtimestamp(timestamp, datetime.UTC).strftime(
+                    "%d.%m.%y"
+                )
+                for timestamp in (self.start, self.end)
+            )
+            return f"{self.name} ({start}-{end})"
+
+    def __init__(
+        self, path: pathlib.Path = appdata.root / "data" / "database" / "imports.json"
+    ) -> None:
+        self._path = path
+        # the lock of the database directory, shared with JsonStorage
+        self._lock = FileLock(path.with_name("lock"))
+        self._entries: list[Ledger.Entry] = []
+        self.reload()
+
+    def reload(self) -> None:
+        if not self._path.exists():
+            self._entries = []
+            return
+        with open(self._path, "r") as fp:
+            self._entries = [
+                Ledger.Entry(**entry) for entry in json.load(fp)["imports"]
+            ]
+
+    @property
+    def entries(self) -> list[Entry]:
+        return self._entries
+
+    def fingerprints(self) -> set[str]:
+        return {entry.fingerprint for entry in self._entries}
+
+    def find(self, fingerprint: str) -> Entry | None:
+        return next(
+            (entry for entry in self._entries if entry.fingerprint == fingerprint),
+            None,
+        )
+
+    def overlaps(self, store: str, start: int, end: int) -> list[Entry]:
+        return [
+            entry
+            for entry in self._entries
+            if entry.store == store
+            and entry.rows
+            and entry.start <= end
+            and start <= entry.end
+        ]
+
+    def add(self, entries: list[Entry]) -> None:
+        with self._lock(exclusive=True):
+            # another process may have imported meanwhile
+            self.reload()
+            known = self.fingerprints()
+            for entry in entries:
+                # the same report may come twice under different names
+                if entry.fingerprint not in known:
+                    known.add(entry.fingerprint)
+                    self._entries.append(entry)
+            storage.dump_json(
+                self._path, {"imports": [entry._asdict() for entry in self._entries]}
+            )
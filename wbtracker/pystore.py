@@ -1,17 +1,55 @@
 from abc import ABC, abstractmethod
-from collections.abc import Generator
+from collections.abc import Iterator
 
 import database
+import dates
+import numpy as np
+import pandas as pd
+
+CSV_CHUNK = 100_000
 
 
 class Store(ABC):
     name: str
+    date_format: str
+    sold_status: str
+    schema: dict[str, tuple[str, int]]
+    """Report column of each sale field: header, position if the header is absent."""
 
     @classmethod
     @abstractmethod
-    def build_sale(
-        cls, row: list[str]
-    ) -> tuple[database.Database.Sale, str, str, str]: ...
+    def read_report(cls, path: str) -> Iterator[pd.DataFrame]: ...
+
+    @classmethod
+    def _column(cls, report: pd.DataFrame, field: str) -> pd.Series:
+        header, position = cls.schema[field]
+        headers = [str(column).strip() for column in report.columns]
+        if header in headers:
+            position = headers.index(header)
+        elif position >= len(headers):
+            raise ValueError(f"{cls.name}: нет колонки «{header}»")
+        return report.iloc[:, position]
+
+    @classmethod
+    def parse_sales(cls, report: pd.DataFrame) -> pd.DataFrame:
+        sold = (cls._column(report, "status") == cls.sold_status).to_numpy()
+        frame = pd.DataFrame(
+            {
+                field: cls._column(report, field).to_numpy(dtype=object)[sold]
+                for field in ("sticker", "id", "date", "name", "vendor_code")
+            }
+        )
+        price = pd.to_numeric(
+            cls._column(report, "price")[sold], errors="coerce"
+        ).to_numpy()
+        if np.isnan(price).any():
+            raise ValueError(f"{cls.name}: неверная цена продажи")
+        frame["store"] = cls.name
+        frame["timestamp"] = dates.parse_dates(
+            frame["date"], dates.preferring(cls.date_format)
+        )
+        frame["price"] = price.astype(np.int64)
+        return frame[[*database.Database.SaleTable.fields, "name", "vendor_code"]]
 
     @classmethod
     @abstractmethod
@@ -20,23 +58,21 @@ class Store(ABC):
 
 class WB(Store):
     name = "wb"
+    date_format = dates.WB_FORMAT
+    sold_status = "Продано"
+    schema = {
+        "sticker": ("Стикер", 2),
+        "date": ("Дата", 4),
+        "name": ("Наименование", 6),
+        "price": ("Цена с учетом скидки", 10),
+        "id": ("Артикул WB", 12),
+        "vendor_code": ("Артикул продавца", 13),
+        "status": ("Статус", 16),
+    }
 
     @classmethod
-    def build_sale(cls, row: list[str]) -> tuple[database.Database.Sale, str, str, str]:
-        return (
-            database.Database.Sale(
-                {
-                    "store": cls.name,
-                    "sticker": row[2],
-                    "id": row[12],
-                    "date": row[4],
-                    "price": int(float(row[10])),
-                }
-            ),
-            row[16],
-            row[6],
-            row[13],
-        )
+    def read_report(cls, path: str) -> Iterator[pd.DataFrame]:
+        yield pd.read_excel(path, dtype=str, keep_default_na=False)
 
     @classmethod
     def link(cls, id: str) -> str:
@@ -45,23 +81,24 @@ class WB(Store):
 
 class Ozon(Store):
     name = "ozon"
+    date_format = dates.OZON_FORMAT
+    sold_status = "Доставлен"
+    schema = {
+        "sticker": ("Номер заказа", 0),
+        "status": ("Статус", 4),
+        "date": ("Дата доставки", 5),
+        "price": ("Сумма отправления", 8),
+        "name": ("Наименование товара", 10),
+        "id": ("OZON id", 11),
+        "vendor_code": ("Артикул", 12),
+    }
 
     @classmethod
-    def build_sale(cls, row: list[str]) -> tuple[database.Database.Sale, str, str, str]:
-        return (
-            database.Database.Sale(
-                {
-                    "store": cls.name,
-                    "sticker": row[0],
-                    "id": row[11],
-                    "date": row[5],
-                    "price": int(float(row[8])),
-                }
-            ),
-            row[4],
-            row[10],
-            row[12],
-        )
+    def read_report(cls, path: str) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(
+            path, sep=";", dtype=str, keep_default_na=False, chunksize=CSV_CHUNK
+        ) as chunks:
+            yield from chunks
 
     @classmethod
     def link(cls, id: str) -> str:
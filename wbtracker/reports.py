@@ -0,0 +1,231 @@
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import pathlib
+import queue
+import shutil
+import threading
+import time
+from collections.abc import Generator
+from concurrent.futures import ProcessPoolExecutor
+
+import appdata
+import database
+import dates
+import numpy as np
+import pandas as pd
+import pystore
+from ledger import Ledger
+
+CACHE = appdata.root / "cache" / "reports"
+CACHE_LIMIT = 512 * 1024 * 1024
+CACHE_VERSION = 2
+"""Bump when parsing changes, so older cached reports are not reused."""
+
+
+def fingerprint(path: str) -> str:
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def _parse_sales(store: str, path: str) -> Generator[pd.DataFrame]:
+    report = pystore.get_store(store)[0]
+    for chunk in report.read_report(path):
+        frame = report.parse_sales(chunk)
+        yield frame.astype(
+            {field: "category" for field in frame if frame[field].dtype != np.int64}
+        )
+
+
+def read_sales(
+    store: str, path: str, digest: str | None = None
+) -> Generator[pd.DataFrame]:
+    """Sold rows of a report chunk by chunk, strings as categoricals.
+
+    Parsed chunks are cached by the content of the file, so importing the
+    same report again does not decode it a second time.
+    """
+    digest = digest or fingerprint(path)
+    entry = CACHE / f"{store}-{CACHE_VERSION}-{digest}"
+    if entry.exists():
+        os.utime(entry)
+        for chunk in sorted(entry.iterdir()):
+            yield pd.read_pickle(chunk)
+        return
+    tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+    try:
+        for n, batch in enumerate(_parse_sales(store, path)):
+            batch.to_pickle(tmp / f"{n:08d}.pkl")
+            yield batch
+        with contextlib.suppress(OSError):
+            # the same report may come twice in one import
+            os.rename(tmp, entry)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def evict_cache(limit: int = CACHE_LIMIT) -> None:
+    """Drop the least recently used reports until the cache fits ``limit``."""
+    if not CACHE.exists():
+        return
+    entries = []
+    for entry in CACHE.iterdir():
+        if entry.suffix != ".tmp":
+            size = sum(chunk.stat().st_size for chunk in entry.iterdir())
+            entries.append((entry.stat().st_mtime, size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+PRODUCT_FIELDS = ("vendor_code", "name", "price")
+
+
+def send_sales(
+    store: str,
+    path: str,
+    batches: queue.Queue,
+    known: set[str],
+    cancelled: threading.Event,
+) -> tuple[str, bool]:
+    """Put the sales of a report into ``batches``.
+
+    Of a report that was imported only the product fields are sent, to
+    update the products added since. ``(path, None)`` follows the last
+    batch, as the batches may still be queued when the worker is done;
+    once ``cancelled`` is set the worker stops without it.
+    """
+    digest = fingerprint(path)
+    for batch in read_sales(store, path, digest):
+        if cancelled.is_set():
+            return digest, False
+        if digest in known:
+            batch = batch[["store", "id", *PRODUCT_FIELDS]]
+        batches.put((path, batch))
+    batches.put((path, None))
+    return digest, digest not in known
+
+
+def _note_missing(
+    batch: pd.DataFrame,
+    summary: database.Database.Summary,
+    missing: dict[database.Database.Product.Key, str],
+) -> None:
+    vendor_codes = dict(zip(zip(batch["store"], batch["id"]), batch["vendor_code"]))
+    for key in summary.missing:
+        missing.setdefault(key, vendor_codes[key])
+
+
+def import_sales(store: str, paths: list[str]) -> Generator[str]:
+    """Parse reports in worker processes and add their sales as batches arrive.
+
+    The queue is bounded, so a slow database holds the workers back instead
+    of piling parsed chunks up in memory. Reports listed in the ledger only
+    update the products, usually from the cache; an overlap with earlier
+    reports is reported, and only its sales missing from the database are
+    added.
+    """
+    db = database.get_db()
+    imports = Ledger()
+    workers = max(1, min(len(paths), os.cpu_count() or 1))
+    missing: dict[database.Database.Product.Key, str] = {}
+    # sales read, sales added and their time range
+    stats = {path: [0, 0, dates.NO_DATE, dates.NO_DATE] for path in paths}
+    updated = dict.fromkeys(paths, 0)
+    entries: list[Ledger.Entry] = []
+    done = 0
+    # fork would copy the loaded database and could inherit locks held by
+    # other threads mid-operation
+    context = multiprocessing.get_context("spawn")
+    with (
+        ProcessPoolExecutor(workers, mp_context=context) as pool,
+        context.Manager() as manager,
+    ):
+        batches = manager.Queue(2 * workers)
+        cancelled = manager.Event()
+        futures = {
+            path: pool.submit(
+                send_sales, store, path, batches, imports.fingerprints(), cancelled
+            )
+            for path in paths
+        }
+        pending = {future: path for path, future in futures.items()}
+        try:
+            while pending or not batches.empty():
+                for future in [future for future in pending if future.done()]:
+                    name = pathlib.Path(pending.pop(future)).name
+                    try:
+                        future.result()
+                    except Exception as error:
+                        yield f"warning: неправильный формат отчета {name} ({error})"
+                    else:
+                        # finished when its last batch is read
+                        continue
+                    done += 1
+                    yield f"обработано отчетов: {done} из {len(futures)}"
+                try:
+                    path, batch = batches.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                name = pathlib.Path(path).name
+                if batch is None:
+                    # the worker returns right after putting the end of its report
+                    digest, parsed = futures[path].result()
+                    done += 1
+                    if not parsed:
+                        yield (
+                            f"{name}: уже загружен как {imports.find(digest).describe()}, "
+                            f"обновлено товаров: {updated[path]}"
+                        )
+                        yield f"обработано отчетов: {done} из {len(futures)}"
+                        continue
+                    rows, added, start, end = stats[path]
+                    entry = Ledger.Entry(
+                        digest, store, name, start, end, rows, added, int(time.time())
+                    )
+                    for other in imports.overlaps(store, entry.start, entry.end):
+                        yield f"{name}: пересекается с {other.describe()}"
+                    entries.append(entry)
+                    yield f"обработано отчетов: {done} из {len(futures)}"
+                    continue
+                if "timestamp" not in batch:
+                    # product fields of an imported report
+                    summary = db.update_sold_products(batch)
+                    updated[path] += summary.updated
+                    _note_missing(batch, summary, missing)
+                    continue
+                summary = db.add_sales_bulk(batch)
+                timestamps = batch["timestamp"].to_numpy()
+                if len(timestamps := timestamps[timestamps != dates.NO_DATE]):
+                    start, end = int(timestamps.min()), int(timestamps.max())
+                    if stats[path][2] != dates.NO_DATE:
+                        start, end = min(start, stats[path][2]), max(
+                            end, stats[path][3]
+                        )
+                    stats[path][2:] = start, end
+                stats[path][0] += len(batch)
+                stats[path][1] += summary.added
+                _note_missing(batch, summary, missing)
+                yield f"{name}: +{len(batch)} продаж"
+        except GeneratorExit:
+            # cancelled: the reports read so far are dropped with the rest
+            cancelled.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            while not all(future.done() for future in pending):
+                # unblock the workers waiting to put a batch
+                with contextlib.suppress(queue.Empty):
+                    batches.get(timeout=0.05)
+            db.rollback()
+            raise
+    # saved before the last messages, so a cancel cannot stop it halfway
+    db.save()
+    imports.add(entries)
+    evict_cache()
+    for vendor_code in missing.values():
+        yield f"warning: {vendor_code} not found"
+    yield f"добавлено продаж: {sum(entry.added for entry in entries)}"
@@ -0,0 +1,512 @@
+import contextlib
+import itertools
+import json
+import os
+import pathlib
+import re
+import shutil
+import sqlite3
+from abc import ABC, abstractmethod
+from collections.abc import Generator, Iterable
+from contextlib import AbstractContextManager
+from typing import Protocol
+
+import dates
+import numpy as np
+from filelock import FileLock
+from journal import Journal
+
+JOURNAL_LIMIT = 16 * 1024 * 1024
+READ_CHUNK = 1024 * 1024
+
+PRODUCT_FIELDS = ("store", "id", "vendor_code", "name", "price", "cost", "brand")
+SALE_FIELDS = ("store", "sticker", "id", "date", "timestamp", "price")
+
+
+class Table(Protocol):
+
+    def __len__(self) -> int: ...
+
+    def records(self, rows: np.ndarray | None = None) -> list[dict]: ...
+
+    def partitions(self) -> Iterable[tuple[int, np.ndarray]]: ...
+
+    def snapshot(self) -> tuple[dict[str, list[str]], dict[str, np.ndarray]]: ...
+
+    def aggregates(self) -> dict[str, list]: ...
+
+
+class Storage(ABC):
+    """Where the database lives.
+
+    Several processes may share one storage: readers hold lock(), writers
+    lock(exclusive=True). Under the lock, stale() tells that another process
+    rewrote the snapshot and everything must be load()ed again, otherwise
+    updates() yields the changes it saved since our last read.
+    """
+
+    def lock(self, exclusive: bool = False) -> AbstractContextManager:
+        return contextlib.nullcontext()
+
+    def stale(self) -> bool:
+        return False
+
+    def updates(self) -> Generator[dict]:
+        yield from ()
+
+    def snapshot(self) -> tuple[dict[str, list[str]], dict[str, np.ndarray]] | None:
+        return None
+
+    def aggregates(self) -> tuple[dict[str, list], int] | None:
+        """Monthly aggregates of the snapshot and the number of sales in it."""
+        return None
+
+    @abstractmethod
+    def load(self) -> Generator[dict]: ...
+
+    @abstractmethod
+    def save(self, changes: Iterable[dict]) -> None: ...
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    @abstractmethod
+    def compact(self, products: list[dict], sales: Table) -> None: ...
+
+
+def dump_json(path: pathlib.Path, obj: dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as fp:
+        json.dump(obj, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp, path)
+
+
+def _stream(path: pathlib.Path, key: str) -> Generator[dict]:
+    """Yield the elements of the array ``key`` of a JSON object one at a time.
+
+    Only a chunk of the text and a single element are held at once, unlike
+    json.load which keeps the whole text and the whole list alive together.
+    """
+    decoder = json.JSONDecoder()
+    start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+    separator = re.compile(r"[\s,]*")
+    closing = re.compile(r"\s*[,\]]")
+    with open(path, "r") as fp:
+        buffer, eof = "", False
+        while not (match := start.search(buffer)):
+            if eof:
+                raise ValueError(f"{path}: no {key!r} array")
+            chunk = fp.read(READ_CHUNK)
+            buffer, eof = buffer + chunk, not chunk
+        pos = match.end()
+        while True:
+            pos = separator.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                element, end = None, pos
+            if not closing.match(buffer, end):
+                # the element may continue in the next chunk
+                if eof:
+                    raise ValueError(f"{path}: malformed {key!r} array")
+                chunk = fp.read(READ_CHUNK)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield element
+            pos = end
+
+
+def _partition(month: int) -> str:
+    return "undated" if month == dates.NO_DATE else dates.month_label(month, "%Y-%m")
+
+
+class JsonStorage(Storage):
+    """Products in products.json, sales sharded by month under sales/.
+
+    sales/manifest.json lists the partitions with their row count and time
+    range; compaction rewrites only the months changed since the last one.
+    sales/aggregates.json keeps the monthly totals of the compacted sales.
+    """
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self._root = root
+        self._lock = FileLock(root / "lock")
+        self._journal = Journal(root / "journal.jsonl")
+        self._migrated = False
+        self._loaded = False
+        self._dirty: set[str] = set()
+        self._generation = 0
+
+    def lock(self, exclusive: bool = False) -> AbstractContextManager:
+        return self._lock(exclusive)
+
+    def _read_generation(self) -> int:
+        if not (path := self._root / "generation").exists():
+            return 0
+        return int(path.read_text())
+
+    def _write_generation(self, generation: int) -> None:
+        tmp = self._root / "generation.tmp"
+        tmp.write_text(str(generation))
+        os.replace(tmp, self._root / "generation")
+
+    def stale(self) -> bool:
+        return self._read_generation() != self._generation
+
+    def _aggregates_path(self) -> pathlib.Path:
+        return self._root / "sales" / "aggregates.json"
+
+    def _write_aggregates(
+        self, path: pathlib.Path, sales: Table, generation: int
+    ) -> None:
+        dump_json(
+            path,
+            {"generation": generation, "rows": len(sales), "cells": sales.aggregates()},
+        )
+
+    def aggregates(self) -> tuple[dict[str, list], int] | None:
+        if not (path := self._aggregates_path()).exists():
+            return None
+        with open(path, "r") as fp:
+            aggregates = json.load(fp)
+        # written before the generation, so a crash in between leaves it stale
+        if aggregates["generation"] != self._generation:
+            return None
+        return aggregates["cells"], aggregates["rows"]
+
+    def updates(self) -> Generator[dict]:
+        return self._upgrade(self._read_journal())
+
+    @property
+    def _manifest(self) -> dict[str, dict] | None:
+        if not (path := self._root / "sales" / "manifest.json").exists():
+            return None
+        with open(path, "r") as fp:
+            return json.load(fp)["partitions"]
+
+    def _touch(self, record: dict) -> None:
+        if record["op"] == "sale":
+            months = [dates.months(record["args"]["timestamp"])]
+        elif record["op"] == "sales":
+            months = np.unique(dates.months(record["columns"]["timestamp"]))
+        else:
+            return
+        self._dirty.update(_partition(int(month)) for month in months)
+
+    def _upgrade(self, records: Iterable[dict]) -> Generator[dict]:
+        for record in records:
+            if record["op"] == "sale" and "timestamp" not in record["args"]:
+                record["args"]["timestamp"] = dates.parse_date(record["args"]["date"])
+                self._migrated = True
+            yield record
+
+    def _read_sales(self) -> Generator[dict]:
+        if (manifest := self._manifest) is None:
+            # sales.json from before the sharding, rewritten on compaction
+            self._migrated = True
+            paths = [self._root / "sales.json"]
+        else:
+            paths = [self._root / "sales" / f"{name}.json" for name in manifest]
+        for path in paths:
+            for args in _stream(path, "sales"):
+                yield {"op": "sale", "args": args}
+
+    def _read_journal(self) -> Generator[dict]:
+        for record in self._journal.read():
+            self._touch(record)
+            yield record
+
+    def _read(self) -> Generator[dict]:
+        for args in _stream(self._root / "products.json", "products"):
+            yield {"op": "product", "args": args}
+        yield from self._read_sales()
+        yield from self._read_journal()
+
+    def load(self) -> Generator[dict]:
+        self._loaded = True
+        self._generation = self._read_generation()
+        self._journal = Journal(self._root / "journal.jsonl")
+        return self._upgrade(self._read())
+
+    def save(self, changes: Iterable[dict]) -> None:
+        changes = list(changes)
+        for record in changes:
+            self._touch(record)
+        self._journal.append(changes)
+
+    def _snapshot_size(self) -> int:
+        sales = self._root / "sales"
+        return (self._root / "products.json").stat().st_size + sum(
+            path.stat().st_size for path in (sales.iterdir() if sales.exists() else [])
+        )
+
+    def needs_compaction(self) -> bool:
+        return self._migrated or self._journal.size > max(
+            JOURNAL_LIMIT, self._snapshot_size() // 2
+        )
+
+    def compact(self, products: list[dict], sales: Table) -> None:
+        # a storage that was not loaded from has no idea what changed
+        old = {} if self._migrated or not self._loaded else self._manifest or {}
+        directory = self._root / "sales"
+        directory.mkdir(exist_ok=True)
+        manifest = {}
+        for month, rows in sales.partitions():
+            name = _partition(month)
+            if name in old and name not in self._dirty:
+                manifest[name] = old[name]
+                continue
+            records = sales.records(rows)
+            dump_json(directory / f"{name}.json", {"sales": records})
+            timestamps = [record["timestamp"] for record in records]
+            manifest[name] = {
+                "rows": len(records),
+                "start": min(timestamps),
+                "end": max(timestamps),
+            }
+        dump_json(self._root / "products.json", {"products": products})
+        dump_json(directory / "manifest.json", {"partitions": manifest})
+        self._journal.clear()
+        self._generation = self._read_generation() + 1
+        self._write_aggregates(self._aggregates_path(), sales, self._generation)
+        self._write_generation(self._generation)
+        self._migrated = False
+        self._dirty.clear()
+        for path in directory.glob("*.json"):
+            if path.stem not in manifest and path.name not in (
+                "manifest.json",
+                "aggregates.json",
+            ):
+                path.unlink()
+        (self._root / "sales.json").unlink(missing_ok=True)
+
+
+class NpyStorage(JsonStorage):
+
+    def __init__(self, root: pathlib.Path) -> None:
+        super().__init__(root / "npy")
+        self._root.mkdir(exist_ok=True)
+        self._fallback = JsonStorage(root)
+
+    def _current(self) -> pathlib.Path | None:
+        if not (pointer := self._root / "CURRENT").exists():
+            return None
+        return self._root / pointer.read_text().strip()
+
+    def _read_generation(self) -> int:
+        return int(current.name) if (current := self._current()) else 0
+
+    def _aggregates_path(self) -> pathlib.Path:
+        return self._root / f"{self._generation:08d}" / "aggregates.json"
+
+    def snapshot(self) -> tuple[dict[str, list[str]], dict[str, np.ndarray]] | None:
+        if not (current := self._current()):
+            return None
+        with open(current / "strings.json", "r") as fp:
+            strings = json.load(fp)
+        arrays = {}
+        for path in current.glob("*.npy"):
+            array = np.load(path, mmap_mode="r")
+            arrays[path.stem] = array if len(array) else np.load(path)
+        if "timestamp" not in arrays:
+            arrays["timestamp"] = dates.parse_dates(strings["date"])[arrays["date"]]
+            self._migrated = True
+        return strings, arrays
+
+    def _read(self) -> Generator[dict]:
+        if current := self._current():
+            for args in _stream(current / "products.json", "products"):
+                yield {"op": "product", "args": args}
+        else:
+            yield from self._fallback._read()
+        yield from self._journal.read()
+
+    def _snapshot_size(self) -> int:
+        return sum(path.stat().st_size for path in self._current().iterdir())
+
+    def needs_compaction(self) -> bool:
+        return not self._current() or super().needs_compaction()
+
+    def compact(self, products: list[dict], sales: Table) -> None:
+        strings, arrays = sales.snapshot()
+        # month by month, so a period only pages in its own slice of the maps
+        order = np.concatenate(
+            [np.empty(0, np.int64), *(rows for _, rows in sales.partitions())]
+        )
+        arrays = {field: array[order] for field, array in arrays.items()}
+        current = self._current()
+        snapshot = self._root / f"{int(current.name) + 1 if current else 1:08d}"
+        # left by a compaction that crashed before moving CURRENT to it
+        shutil.rmtree(snapshot, ignore_errors=True)
+        snapshot.mkdir()
+        dump_json(snapshot / "products.json", {"products": products})
+        dump_json(snapshot / "strings.json", strings)
+        for field, array in arrays.items():
+            np.save(snapshot / f"{field}.npy", array)
+        self._write_aggregates(snapshot / "aggregates.json", sales, int(snapshot.name))
+        tmp = self._root / "CURRENT.tmp"
+        tmp.write_text(snapshot.name)
+        os.replace(tmp, self._root / "CURRENT")
+        self._journal.clear()
+        self._generation = int(snapshot.name)
+        self._migrated = False
+        for old in self._root.iterdir():
+            if old.is_dir() and old != snapshot:
+                # still mapped by another process on Windows, retried next time
+                shutil.rmtree(old, ignore_errors=True)
+
+
+class SqliteStorage(Storage):
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            store TEXT NOT NULL,
+            id TEXT NOT NULL,
+            vendor_code TEXT NOT NULL,
+            name TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            cost INTEGER NOT NULL,
+            brand TEXT NOT NULL,
+            PRIMARY KEY (store, id)
+        );
+        CREATE TABLE IF NOT EXISTS sales (
+            store TEXT NOT NULL,
+            sticker TEXT NOT NULL,
+            id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            PRIMARY KEY (store, sticker, id, date)
+        );
+        CREATE INDEX IF NOT EXISTS sales_product ON sales (store, id);
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._lock = FileLock(path.with_name(f"{path.name}.lock"))
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(self.SCHEMA)
+        self._migrate()
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS sales_timestamp ON sales (timestamp)"
+        )
+        self._data_version = -1
+
+    def _migrate(self) -> None:
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(sales)")
+        ]
+        if "timestamp" in columns:
+            return
+        rows = self._connection.execute("SELECT rowid, date FROM sales").fetchall()
+        timestamps = dates.parse_dates([date for _, date in rows])
+        with self._connection:
+            self._connection.execute("DROP INDEX IF EXISTS sales_date")
+            self._connection.execute(
+                "ALTER TABLE sales ADD COLUMN "
+                f"timestamp INTEGER NOT NULL DEFAULT {dates.NO_DATE}"
+            )
+            self._connection.executemany(
+                "UPDATE sales SET timestamp = ? WHERE rowid = ?",
+                zip(timestamps.tolist(), (rowid for rowid, _ in rows)),
+            )
+
+    def lock(self, exclusive: bool = False) -> AbstractContextManager:
+        return self._lock(exclusive)
+
+    def _read_data_version(self) -> int:
+        # changes only when another connection commits
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def stale(self) -> bool:
+        return self._read_data_version() != self._data_version
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def load(self) -> Generator[dict]:
+        self._data_version = self._read_data_version()
+        for table, op, fields in (
+            ("products", "product", PRODUCT_FIELDS),
+            ("sales", "sale", SALE_FIELDS),
+        ):
+            for row in self._connection.execute(
+                f"SELECT {', '.join(fields)} FROM {table} ORDER BY rowid"
+            ):
+                yield {"op": op, "args": dict(zip(fields, row))}
+
+    @staticmethod
+    def _statement(record: dict) -> tuple[str, tuple[str, ...]]:
+        if record["op"] == "update":
+            return record["op"], tuple(record["fields"])
+        elif record["op"] == "sales":
+            return "sale", ()
+        return record["op"], ()
+
+    @staticmethod
+    def _sql(op: str, fields: tuple[str, ...]) -> str:
+        if op == "product":
+            table, fields = "products", PRODUCT_FIELDS
+        elif op == "sale":
+            table, fields = "sales", SALE_FIELDS
+        elif op == "update":
+            assignments = ", ".join(f"{field} = ?" for field in fields)
+            return f"UPDATE products SET {assignments} WHERE store = ? AND id = ?"
+        else:
+            raise ValueError(f"unknown change record: {op}")
+        return (
+            f"INSERT OR IGNORE INTO {table} ({', '.join(fields)}) "
+            f"VALUES ({', '.join('?' * len(fields))})"
+        )
+
+    @staticmethod
+    def _params(record: dict) -> Iterable[tuple]:
+        if record["op"] == "update":
+            return [(*record["fields"].values(), *record["key"])]
+        elif record["op"] == "sales":
+            return zip(*(record["columns"][field] for field in SALE_FIELDS))
+        fields = PRODUCT_FIELDS if record["op"] == "product" else SALE_FIELDS
+        return [tuple(record["args"][field] for field in fields)]
+
+    def _write(self, changes: Iterable[dict]) -> None:
+        for statement, records in itertools.groupby(changes, key=self._statement):
+            self._connection.executemany(
+                self._sql(*statement),
+                itertools.chain.from_iterable(map(self._params, records)),
+            )
+
+    def save(self, changes: Iterable[dict]) -> None:
+        with self._connection:
+            self._write(changes)
+
+    def compact(self, products: list[dict], sales: Table) -> None:
+        with self._connection:
+            self._connection.execute("DELETE FROM products")
+            self._connection.execute("DELETE FROM sales")
+            self._write({"op": "product", "args": args} for args in products)
+            self._write({"op": "sale", "args": args} for args in sales.records())
+
+
+def migrate(source: Storage, path: pathlib.Path) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    target = SqliteStorage(tmp)
+    with source.lock():
+        target.save(source.load())
+    target.close()
+    os.replace(tmp, path)
+
+
+def open_storage(engine: str, root: pathlib.Path) -> Storage:
+    if engine == "json":
+        return JsonStorage(root)
+    elif engine == "npy":
+        return NpyStorage(root)
+    elif engine == "sqlite":
+        if not (path := root / "database.sqlite3").exists():
+            migrate(JsonStorage(root), path)
+        return SqliteStorage(path)
+    raise ValueError(f"unknown storage engine: {engine}")
@@ -2,77 +2,65 @@ import datetime
 import webbrowser
 from collections.abc import Generator
 from pathlib import Path
-from tkinter.filedialog import askopenfile
 
+import analysis
 import database
-import matplotlib.pyplot as plt
+import dates
 import numpy as np
 import opener
 import pandas as pd
 import pystore
+import reports
+from ledger import Ledger
 
 
-def read_products() -> Generator[database.Database.Product]:
-    if not (file := askopenfile()):
-        return
-    for row in pd.read_excel(file.name).values:
-        yield pystore.build_product(str(row[0]), str(row[1]), int(float(row[2])))
-
-
-def read_wb_sales() -> Generator[tuple[database.Database.Sale, str, str, str]]:
-    if not (file := askopenfile()):
-        return
-    for row in pd.read_excel(file.name).values:
-        yield pystore.WB.build_sale(list(map(str, row)))
+def ask_files(multiple: bool = False) -> list[str]:
+    # imported here so that the command line runs without a display
+    from tkinter.filedialog import askopenfile, askopenfilenames
 
+    if multiple:
+        return list(askopenfilenames())
+    return [file.name] if (file := askopenfile()) else []
 
-def read_ozon_sales() -> Generator[tuple[database.Database.Sale, str, str, str]]:
-    if not (file := askopenfile()):
-        return
-    for row in pd.read_csv(file.name, sep=";").values:
-        yield pystore.Ozon.build_sale(list(map(str, row)))
 
-
-def add_product(product: database.Database.Product) -> None:
-    if db_product := database.db.find_product(product.key):
-        db_product.cost = product.cost
-    else:
-        database.db.add_product(product)
+def read_products(path: str) -> Generator[database.Database.Product]:
+    for row in pd.read_excel(path).values:
+        yield pystore.build_product(str(row[0]), str(row[1]), int(float(row[2])))
 
 
-def add_products() -> Generator[str]:
+def add_products(path: str | None = None) -> Generator[str]:
+    if not (paths := [path] if path else ask_files()):
+        return
     try:
-        for product in read_products():
+        products = []
+        for product in read_products(paths[0]):
             yield f"{product.key}"
             if product._store == "unknown":
                 yield f"warning: неверно указан магазин для {product._id}"
             elif product.cost < 0:
                 yield f"warning: себестоимость не может быть отрицательной (id: {product._id})"
             else:
-                add_product(product)
-        database.db.save()
+                products.append(product.args)
+        database.get_db().add_products_bulk(
+            pd.DataFrame(products, columns=list(database.Database.Product.fields))
+        )
+        database.get_db().save()
     except Exception:
         yield "warning: неправильный формат таблицы. данные не были введены"
 
 
-def add_sale(sale: database.Database.Sale, name: str, vendor_code: str) -> None:
-    database.db.add_sale(sale)
-    if product := database.db.find_product(sale.product_key):
-        product.name = name
-        product.vendor_code = vendor_code
-        product.price = sale.price
+def add_sales(store: str, paths: list[str] | None = None) -> Generator[str]:
+    if paths := paths or ask_files(multiple=True):
+        yield from reports.import_sales(store, paths)
 
 
-def add_sales(store: str) -> Generator[str]:
-    sales = read_wb_sales() if store == "wb" else read_ozon_sales()
-    ok_status = "Продано" if store == "wb" else "Доставлен"
-    for sale, status, name, vendor_code in sales:
-        yield f"{sale.key}"
-        if status == ok_status:
-            add_sale(sale, name, vendor_code)
-            if not database.db.find_product(sale.product_key):
-                yield f"warning: {vendor_code} not found"
-    database.db.save()
+def imports() -> list[str]:
+    return [
+        f"{datetime.datetime.fromtimestamp(entry.imported):%d.%m.%y %H:%M} "
+        f"{entry.store}: {entry.describe()}, продаж {entry.rows}, "
+        f"новых {entry.added}"
+        for entry in Ledger().entries
+    ]
 
 
 def webopen(name: str, id: str) -> None:
@@ -126,41 +114,35 @@ def download_products() -> str:
 
 
 def fix_date(df: pd.DataFrame, format: str):
+    codes, months = pd.factorize(df["month"].to_numpy())
+    labels = [
+        dates.month_label(month, format) if month != dates.NO_DATE else "01.01"
+        for month in months.tolist()
+    ]
+    df["date"] = np.array(labels, dtype=object)[codes]
 
-    def short_date(date: str):
-        try:
-            date_format = "%H:%M:%S %d.%m.%Y"
-            return datetime.datetime.strptime(date, date_format).strftime(format)
-        except Exception:
-            try:
-                date_format = "%Y-%m-%d %H:%M:%S"
-                return datetime.datetime.strptime(date, date_format).strftime(format)
-            except Exception:
-                return "01.01"
 
-    df["date"] = df["date"].apply(short_date)
+PERIOD = datetime.timedelta(days=90)
 
 
-def get_df_sales(start: datetime.datetime, end: datetime.datetime) -> pd.DataFrame:
+def get_period(months: np.ndarray) -> np.ndarray:
+    month_start = dates.month_start(months)
+    now = dates.to_timestamp(datetime.datetime.now())
+    return np.where(
+        month_start != dates.NO_DATE,
+        (now - month_start) // int(PERIOD.total_seconds()),
+        -1,
+    )
 
-    def check_date(row: pd.Series):
-        try:
-            date_format = (
-                "%H:%M:%S %d.%m.%Y" if row["store"] == "wb" else "%Y-%m-%d %H:%M:%S"
-            )
-            return start <= datetime.datetime.strptime(row["date"], date_format) <= end
-        except Exception:
-            return False
-
-    full = database.get_full()
-    print(full)
+
+def get_df_sales(start: datetime.datetime, end: datetime.datetime) -> pd.DataFrame:
+    full = database.get_full(start, end)
     full = (
-        full[full.apply(check_date, axis=1)]
-        .groupby(["store", "id"])
+        full.groupby(["store", "id"], observed=True)
         .agg(
             {
-                "vendor_code": "max",
-                "name": "max",
+                "vendor_code": "first",
+                "name": "first",
                 "price": "sum",
                 "date": "count",
                 "cost": "max",
@@ -169,7 +151,6 @@ def get_df_sales(start: datetime.datetime, end: datetime.datetime) -> pd.DataFra
         .rename(columns={"price": "sum", "date": "n"})
         .reset_index(level=0)
     )
-    print(full)
     df = full
     df = df[df["n"] > 0]
     df["profit"] = df["sum"] - df["cost"] * df["n"]
@@ -198,57 +179,53 @@ def download_sales(
     return str(file)
 
 
-def build_plot(art: str) -> None:
+STORE_COLORS = {"wb": "violet", "ozon": "blue"}
 
-    full = database.get_full()
-    fix_date(full, "%m.%y")
-
-    month, year = map(int, datetime.date.today().strftime("%m %y").split())
-    months = []
-    for i in range(25):
-        months.append(f"{month // 10}{month % 10}.{year % 100}")
-        month -= 1
-        if not month:
-            year -= 1
-            month = 12
-    months = months[::-1]
-    wb = [
-        sum(
-            (full["date"] == months[i])
-            & (full["vendor_code"].str.contains(art))
-            & (full["store"] == "wb")
-        )
-        for i in range(25)
-    ]
-    ozon = [
-        sum(
-            (full["date"] == months[i])
-            & (full["vendor_code"].str.contains(art))
-            & (full["store"] == "ozon")
-        )
-        for i in range(25)
-    ]
 
-    plt.figure(figsize=(15, 6))
+def plot_data(art: str) -> tuple[list[int], dict[str, list[int]]]:
+    current = dates.month_of(datetime.date.today())
+    months = list(range(current - 24, current + 1))
 
-    x = np.arange(25)
+    monthly = database.get_monthly()
+    vendor_codes = monthly["vendor_code"].cat
+    matches = np.append(vendor_codes.categories.str.contains(art), False)
+    monthly = monthly[matches[vendor_codes.codes.to_numpy()]]
+    counts = (
+        monthly.groupby(["store", "month"], observed=True)["count"]
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(index=monthly["store"].cat.categories, columns=months, fill_value=0)
+    )
+    return months, {store: row.tolist() for store, row in counts.iterrows()}
+
+
+def show_plot(months: list[int], counts: dict[str, list[int]]) -> None:
+    import matplotlib.pyplot as plt
 
-    plt.bar(x - 0.2, wb, 0.4, color="violet")
-    plt.bar(x + 0.2, ozon, 0.4, color="blue")
+    plt.figure(figsize=(15, 6))
+
+    x = np.arange(len(months))
+    width = 0.8 / max(len(counts), 1)
 
-    for i in range(25):
-        plt.text(i - 0.4, wb[i], str(wb[i]), rotation=45)
-        plt.text(i, ozon[i], str(ozon[i]), rotation=45)
+    for n, (store, values) in enumerate(counts.items()):
+        offset = (n - (len(counts) - 1) / 2) * width
+        plt.bar(x + offset, values, width, color=STORE_COLORS.get(store), label=store)
+        for i, value in enumerate(values):
+            plt.text(i + offset - width / 2, value, str(value), rotation=45)
 
-    plt.xticks(x, months, rotation=45)
+    plt.xticks(x, [dates.month_label(month) for month in months], rotation=45)
 
     plt.xlabel("месяц")
     plt.ylabel("кол-во продаж")
-    plt.legend(["wb", "ozon"])
+    plt.legend()
 
     plt.show()
 
 
+def build_plot(art: str) -> None:
+    show_plot(*plot_data(art))
+
+
 month_names = [
     "Январь",
     "Февраль",
@@ -266,71 +243,87 @@ month_names = [
 
 
 def get_dynamic() -> float:
-
-    def get_period(date: str):
-        return (
-            datetime.datetime.now() - datetime.datetime.strptime(date, "%m.%y")
-        ).days // 90
-
-    full = database.get_full()
-    fix_date(full, "%m.%y")
-    sales_now = full[full["date"].apply(get_period) == 0]
-    sales_last = full[full["date"].apply(get_period) == 1]
-    now = sum(sales_now["price"] - sales_now["cost"])
-    last = sum(sales_last["price"] - sales_last["cost"])
+    monthly = database.get_monthly()
+    period = get_period(monthly["month"].to_numpy())
+    now = int(monthly["profit"][period == 0].sum())
+    last = int(monthly["profit"][period == 1].sum())
     return now / last if last != 0 else 1
 
 
-def get_ABC() -> tuple[int, int, int]:
+KEYS = {
+    "vendor_code": ["vendor_code"],
+    "id": ["store", "id"],
+    "brand": ["brand"],
+    "store": ["store"],
+}
+
+
+def get_abc_xyz(
+    period: datetime.timedelta = PERIOD,
+    key: str = "vendor_code",
+    thresholds: tuple[float, float] = analysis.ABC,
+) -> pd.DataFrame:
+    return analysis.abc_xyz(
+        database.get_monthly(),
+        analysis.period_months(period),
+        KEYS[key],
+        abc_thresholds=thresholds,
+    )
 
-    def get_period(date: str):
-        return (
-            datetime.datetime.now() - datetime.datetime.strptime(date, "%m.%y")
-        ).days // 90
 
-    full = database.get_full()
-    fix_date(full, "%m.%y")
-    full = full[full["date"].apply(get_period) == 0]
-    full["profit"] = full["price"] - full["cost"]
-    sales = list(
-        (full.groupby("vendor_code").agg({"profit": "sum"}))["profit"].sort_values(
-            ascending=False
-        )
-    )
-    if not sales:
+def get_ABC(
+    period: datetime.timedelta = PERIOD,
+    key: str = "vendor_code",
+    thresholds: tuple[float, float] = analysis.ABC,
+) -> tuple[int, int, int]:
+    classes = get_abc_xyz(period, key, thresholds)["abc"]
+    if not len(classes):
         return 0, 0, 0
-    s = sum(sales)
-    a = 0
-    while sum(sales[:a]) < 0.8 * sum(sales):
-        a += 1
-    b = a
-    while sum(sales[:b]) < 0.95 * sum(sales):
-        b += 1
-    c = len(sales)
-    return (
-        (a + 1) * 100 // len(sales),
-        (b - a + 1) * 100 // len(sales),
-        (c - b + 1) * 100 // len(sales),
+    a, b, c = ((classes == label).sum() * 100 // len(classes) for label in "ABC")
+    return int(a), int(b), int(c)
+
+
+def get_df_abc(
+    period: datetime.timedelta = PERIOD,
+    key: str = "vendor_code",
+    thresholds: tuple[float, float] = analysis.ABC,
+) -> pd.DataFrame:
+    return get_abc_xyz(period, key, thresholds).rename(
+        columns={
+            "store": "Магазин",
+            "id": "Артикул",
+            "vendor_code": "Код продавца",
+            "brand": "Бренд",
+            "profit": "Прибыль",
+            "count": "Кол-во",
+            "variation": "Вариация спроса",
+            "abc": "ABC",
+            "xyz": "XYZ",
+        }
     )
 
 
-def download_full(filename: str) -> str:
+def download_abc(filename: str) -> str:
+    df_to_xlsx(get_df_abc(), file := gen_download_file(filename, "xlsx"))
+    return str(file)
+
 
-    full = database.get_full()
-    fix_date(full, "%m.%y")
+def download_full(filename: str) -> str:
+    monthly = database.get_monthly()
+    fix_date(monthly, "%m.%y")
     sales = (
-        full.groupby(["date", "store", "id"])
-        .agg({"price": "count", "vendor_code": "max", "name": "max", "brand": "max"})
-        .rename(columns={"price": "n"})
+        monthly.groupby(["date", "store", "id"], observed=True)
+        .agg(
+            {
+                "count": "sum",
+                "vendor_code": "first",
+                "name": "first",
+                "brand": "first",
+            }
+        )
+        .rename(columns={"count": "n"})
         .reset_index()
     )
-    print(sales)
-    dates = list(set(sales["date"]))
-    stores = list(set(sales["store"]))
-    brands = list(set(sales["brand"]))
-    df = []
-    for x in sales.values:
-        print(x)
     file = gen_download_file(filename, "xlsx")
     df_to_xlsx(sales, file)
     return str(file)
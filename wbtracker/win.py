@@ -1,6 +1,11 @@
+import contextlib
+import queue
+import threading
+import time
 import weakref
 from abc import ABC, abstractmethod
 from collections.abc import Callable, Generator, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from itertools import chain
 
 import pyglet
@@ -310,7 +315,29 @@ class Input(ActiveObj):
         self._empty = not self.label.text
 
 
+class Progress:
+    """Messages from a background job to the window, and its cancellation."""
+
+    def __init__(self) -> None:
+        self._messages: queue.SimpleQueue[str] = queue.SimpleQueue()
+        self.cancelled = threading.Event()
+
+    def report(self, message: str) -> None:
+        self._messages.put(message)
+
+    def drain(self) -> Generator[str]:
+        while True:
+            try:
+                yield self._messages.get_nowait()
+            except queue.Empty:
+                return
+
+
 class Window(pyglet.window.Window):
+
+    budget = 0.01
+    """Seconds of queued work run per frame before the window redraws."""
+
     def __init__(self, width: int, height: int, name: str) -> None:
         super().__init__(
             width,
@@ -324,6 +351,10 @@ class Window(pyglet.window.Window):
         self._input: Input | None = None
         self._queue: Iterator = iter(())
         self._redraw_flag: bool = True
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="loading")
+        self._waiting: Future | None = None
+        self._progress = Progress()
+        self.busy = False
 
     def __getitem__(self, name: str) -> WinObj:
         return self._objects[name]
@@ -354,7 +385,10 @@ class Window(pyglet.window.Window):
 
     def on_key_press(self, symbol: int, modifiers: int) -> None:
         if symbol == pyglet.window.key.ESCAPE:
-            self.exit()
+            if self.busy:
+                self.cancel()
+            else:
+                self.exit()
         elif self._input:
             self._input.write(symbol, modifiers)
 
@@ -365,18 +399,63 @@ class Window(pyglet.window.Window):
         self._redraw_flag = True
 
     def loading(self, process: Callable[..., Iterator]) -> None:
+        """Queue a generator; it may yield a Future to sleep until it is done."""
         self.set_mouse_cursor(self.get_system_mouse_cursor(self.CURSOR_WAIT))
+        self.busy = True
         self._queue = chain(self._queue, process())
 
+    def background(self, work: Callable, *args) -> Future:
+        return self._executor.submit(work, *args)
+
+    def background_iter(self, work: Callable[..., Iterator[str]], *args) -> Future:
+        """Run a progress generator on the worker, the result is all it yielded.
+
+        Each message is passed to on_progress on the UI thread; cancel() closes
+        the generator at its next message, raising GeneratorExit in it.
+        """
+        progress = self._progress
+
+        def run() -> list[str]:
+            messages = []
+            with contextlib.closing(work(*args)) as steps:
+                for message in steps:
+                    if progress.cancelled.is_set():
+                        break
+                    progress.report(message)
+                    messages.append(message)
+            return messages
+
+        return self._executor.submit(run)
+
+    def on_progress(self, message: str) -> None:
+        pass
+
+    def cancel(self) -> None:
+        self._progress.cancelled.set()
+        self._progress = Progress()
+        if self._waiting:
+            self._waiting.cancel()
+            self._waiting = None
+        self._queue = iter(())
+        self._queue_update(0)
+
     def need_redraw(self) -> None:
         self._redraw_flag = False
 
     def _queue_update(self, dt: float) -> None:
+        for message in self._progress.drain():
+            self.on_progress(message)
+        deadline = time.perf_counter() + self.budget
         try:
-            if self._redraw_flag:
-                next(self._queue)
+            # a step that asked for a redraw waits for the next frame
+            while self._redraw_flag and time.perf_counter() < deadline:
+                if self._waiting and not self._waiting.done():
+                    return
+                self._waiting = None
+                if isinstance(step := next(self._queue), Future):
+                    self._waiting = step
         except StopIteration:
-            pass
+            self.busy = False
             self.set_mouse_cursor(self.get_system_mouse_cursor(self.CURSOR_DEFAULT))
 
     def run(self) -> None:
@@ -384,4 +463,6 @@ class Window(pyglet.window.Window):
         pyglet.app.run(1 / 30)
 
     def exit(self) -> None:
+        self._progress.cancelled.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
         self.close()